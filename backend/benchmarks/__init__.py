@@ -0,0 +1,6 @@
+"""Benchmarks for the Billing API.
+
+Run from the ``backend`` directory, e.g. ``python -m benchmarks.bench_businesses``.
+By default the benchmarks talk to the MongoDB configured by ``MONGO_URL`` using a
+throw-away ``DB_NAME``; pass ``--memory`` to use mongomock-motor instead.
+"""
@@ -0,0 +1,413 @@
+"""Latency percentiles and throughput of every /api endpoint on a seeded database.
+
+Seeds a deterministic dataset (benchmarks.seed), then drives each endpoint through
+the in-process ASGI client: --requests requests per endpoint (heavy exports and
+rebuilds get a fraction of that), --concurrency at a time, after a few untimed
+warm-up requests. Reads run first against the pristine seed; writes, deletes and
+restores act on entities created for them beforehand, outside the timing.
+
+Reported per endpoint: p50/p95/p99 and mean latency in ms, throughput in requests
+per second and the error count. --save stores the run as a baseline JSON file under
+benchmarks/baselines/, and --compare diffs a run against one, exiting non-zero when
+any percentile regressed by more than --threshold percent (and at least 1 ms). The
+run also fails if a route went over its query budget (server.QUERY_BUDGETS).
+
+    python -m benchmarks.bench_api --invoices 100000 --save before
+    python -m benchmarks.bench_api --skip-seed --compare baselines/before.json
+    python -m benchmarks.bench_api --memory --invoices 1000 --requests 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks.common import load_server, asgi_client, percentiles, check_query_budgets
+from benchmarks.seed import add_seed_arguments, seed_from_args
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+WARMUP = 3
+NOISE_FLOOR_MS = 1.0
+# Routes that need GridFS or $indexStats, which mongomock doesn't have
+MEMORY_UNSUPPORTED = {
+    ("POST", "/api/business/upload-logo"),
+    ("GET", "/api/logos/{digest}"),
+    ("GET", "/api/admin/indexes"),
+}
+# 1x1 transparent PNG
+LOGO_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6300010000050001a5f645400000000049454e44ae426082"
+)
+
+
+class Scenario:
+    """One endpoint: ``build(ctx, count)`` returns ``count`` (url, request kwargs) pairs,
+    creating whatever the requests act on; ``share`` scales the request count"""
+
+    def __init__(self, method: str, route: str, build, share: float = 1.0):
+        self.method = method
+        self.route = route
+        self.build = build
+        self.share = share
+
+    @property
+    def key(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+class Context:
+    """Sampled ids and dates from the seeded database, and helpers to create fresh entities"""
+
+    def __init__(self, server, client, seed: int):
+        self.server = server
+        self.db = server.db
+        self.client = client
+        self.rng = random.Random(seed)
+        self.created = 0
+
+    async def load(self, sample_size: int = 500):
+        db = self.db
+        self.business_ids = [doc['id'] for doc in await db.businesses.find({}, {"_id": 0, "id": 1}).limit(sample_size).to_list(None)]
+        self.customers = await db.customers.find({}, {"_id": 0, "search_tokens": 0}).limit(sample_size).to_list(None)
+        self.products = await db.products.find({}, {"_id": 0, "search_tokens": 0}).limit(sample_size).to_list(None)
+        self.invoice_ids = [doc['id'] for doc in await db.invoices.find({"is_deleted": False}, {"_id": 0, "id": 1}).limit(sample_size).to_list(None)]
+        latest = await db.invoices.find_one({}, {"_id": 0, "invoice_date": 1}, sort=[("invoice_date", -1)])
+        if not (self.business_ids and self.customers and self.products and self.invoice_ids):
+            raise SystemExit("The benchmark database is empty; run without --skip-seed")
+        last_day = latest['invoice_date'].date()
+        self.day = last_day.isoformat()
+        self.month_start = last_day.replace(day=1).isoformat()
+        self.closed_month = (last_day.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+        self.admin = (await self.client.get("/api/business")).json()
+
+    def pick(self, values: list):
+        return self.rng.choice(values)
+
+    def unique(self) -> int:
+        self.created += 1
+        return self.created
+
+    def business_payload(self) -> dict:
+        n = self.unique()
+        return {"legal_name": f"Bench Business {n}", "gstin": f"29BENCH{n:08d}", "state_code": "29", "state": "Karnataka", "city": "Bengaluru"}
+
+    def customer_payload(self) -> dict:
+        n = self.unique()
+        return {"name": f"Bench Customer {n}", "phone_1": f"7{n:09d}", "city_1": "Pune", "state_1": "Maharashtra"}
+
+    def product_payload(self) -> dict:
+        n = self.unique()
+        return {"name": f"Bench Product {n}", "category": "Jersey", "hsn": "6110", "gst_rate": 12, "default_rate": 799}
+
+    def invoice_payload(self) -> dict:
+        customer = self.pick(self.customers)
+        items = []
+        for product in self.rng.sample(self.products, min(3, len(self.products))):
+            items.append({
+                "product_name": product['name'], "hsn": product['hsn'], "qty": self.rng.randrange(1, 10),
+                "rate": product['default_rate'], "total": 0, "taxable_amount": 0, "final_amount": 0,
+                "cgst_percent": product['gst_rate'] / 2, "sgst_percent": product['gst_rate'] / 2, "rate_mode": "without_gst",
+            })
+        return {
+            "customer_id": customer['id'], "customer_name": customer['name'], "customer_gstin": customer.get('gstin'),
+            "invoice_date": self.day, "items": items, "payment_status": "unpaid",
+            **dict.fromkeys(("subtotal", "total_discount", "total_cgst", "total_sgst", "total_igst", "total_tax", "grand_total"), 0),
+        }
+
+    async def create(self, path: str, payloads) -> list:
+        """POST each payload and return the created ids"""
+        ids = []
+        for payload in payloads:
+            response = await self.client.post(path, json=payload)
+            response.raise_for_status()
+            ids.append(response.json()['id'])
+        return ids
+
+    async def fresh(self, path: str, payload, count: int) -> list:
+        return await self.create(path, (payload() for _ in range(count)))
+
+    async def archived_invoices(self, count: int) -> list:
+        ids = await self.fresh("/api/invoices", self.invoice_payload, count)
+        for invoice_id in ids:
+            (await self.client.delete(f"/api/invoices/{invoice_id}")).raise_for_status()
+        return ids
+
+
+def same(url: str, **kwargs):
+    """Build function for a request that doesn't change between repetitions"""
+    async def build(ctx, count):
+        return [(url, kwargs)] * count
+    return build
+
+
+def each(make_url, params=None):
+    """Build function for a read of a sampled entity or date range: make_url(ctx) -> url,
+    params(ctx) -> query parameters"""
+    async def build(ctx, count):
+        return [(make_url(ctx), {"params": params(ctx)} if params else {}) for _ in range(count)]
+    return build
+
+
+def on_fresh(path: str, payload_name: str, make_request, archived: bool = False):
+    """Build function for a request that acts on a newly created entity (an update or
+    delete): make_request(ctx, id) -> (url, kwargs)"""
+    async def build(ctx, count):
+        if archived:
+            ids = await ctx.archived_invoices(count)
+        else:
+            ids = await ctx.fresh(path, getattr(ctx, payload_name), count)
+        return [make_request(ctx, entity_id) for entity_id in ids]
+    return build
+
+
+def posting(payload_name: str):
+    async def build(ctx, count):
+        return [(None, {"json": getattr(ctx, payload_name)()}) for _ in range(count)]
+    return build
+
+
+def importing(kind: str, rows: int = 100):
+    """CSV uploads of ``rows`` new customers or products each"""
+    async def build(ctx, count):
+        requests = []
+        for _ in range(count):
+            payloads = [getattr(ctx, f"{kind}_payload")() for _ in range(rows)]
+            columns = list(payloads[0])
+            lines = [",".join(columns)] + [",".join(str(payload[column]) for column in columns) for payload in payloads]
+            requests.append((None, {"files": {"file": (f"{kind}s.csv", "\n".join(lines).encode(), "text/csv")}}))
+        return requests
+    return build
+
+
+async def admin_business_save(ctx, count):
+    payload = {key: value for key, value in ctx.admin.items() if key not in ("id", "created_at", "updated_at", "version")}
+    return [(None, {"json": payload})] * count
+
+
+async def logo_upload(ctx, count):
+    return [(None, {"files": {"file": ("logo.png", LOGO_PNG, "image/png")}})] * count
+
+
+async def logo_download(ctx, count):
+    response = await ctx.client.post("/api/business/upload-logo", files={"file": ("logo.png", LOGO_PNG, "image/png")})
+    response.raise_for_status()
+    return [("/api" + response.json()['logo'], {})] * count
+
+
+async def bulk_payment(ctx, count):
+    requests = []
+    for _ in range(count):
+        ids = ctx.rng.sample(ctx.invoice_ids, min(20, len(ctx.invoice_ids)))
+        requests.append((None, {"json": {"ids": ids, "operation": "payment", "payment_status": "fully_paid", "payment_method": "upi"}}))
+    return requests
+
+
+def this_month(ctx):
+    return {"start_date": ctx.month_start, "end_date": ctx.day}
+
+
+def last_day(ctx):
+    return {"start_date": ctx.day, "end_date": ctx.day}
+
+
+def update(payload_name: str, path: str):
+    return lambda ctx, entity_id: (f"{path}/{entity_id}", {"json": getattr(ctx, payload_name)()})
+
+
+def by_id(path: str, suffix: str = "", **kwargs):
+    return lambda ctx, entity_id: (f"{path}/{entity_id}{suffix}", kwargs)
+
+
+SCENARIOS = [
+    # Reads, against the seeded data as generated
+    Scenario("GET", "/api/", same("/api/")),
+    Scenario("GET", "/api/businesses", same("/api/businesses", params={"limit": 50})),
+    Scenario("GET", "/api/businesses/{business_id}", each(lambda ctx: f"/api/businesses/{ctx.pick(ctx.business_ids)}")),
+    Scenario("GET", "/api/business", same("/api/business")),
+    Scenario("GET", "/api/logos/{digest}", logo_download),
+    Scenario("GET", "/api/customers", same("/api/customers", params={"limit": 50})),
+    Scenario("GET", "/api/customers/{customer_id}", each(lambda ctx: f"/api/customers/{ctx.pick(ctx.customers)['id']}")),
+    Scenario("GET", "/api/customers/{customer_id}/statement", each(lambda ctx: f"/api/customers/{ctx.pick(ctx.customers)['id']}/statement")),
+    Scenario("GET", "/api/products", same("/api/products", params={"limit": 50})),
+    Scenario("GET", "/api/products/{product_id}", each(lambda ctx: f"/api/products/{ctx.pick(ctx.products)['id']}")),
+    Scenario("GET", "/api/invoices", same("/api/invoices", params={"view": "summary"})),
+    Scenario("GET", "/api/invoices/{invoice_id}", each(lambda ctx: f"/api/invoices/{ctx.pick(ctx.invoice_ids)}")),
+    Scenario("GET", "/api/invoices/{invoice_id}/pdf", each(lambda ctx: f"/api/invoices/{ctx.pick(ctx.invoice_ids)}/pdf"), share=0.25),
+    Scenario("GET", "/api/invoices/export", each(lambda ctx: "/api/invoices/export", this_month), share=0.1),
+    Scenario("GET", "/api/invoices/export/items", each(lambda ctx: "/api/invoices/export/items", this_month), share=0.1),
+    Scenario("GET", "/api/invoices/export/pdf", each(lambda ctx: "/api/invoices/export/pdf", last_day), share=0.05),
+    Scenario("GET", "/api/gst-rates", same("/api/gst-rates")),
+    Scenario("GET", "/api/hsn-codes", same("/api/hsn-codes")),
+    Scenario("GET", "/api/dashboard/stats", same("/api/dashboard/stats")),
+    Scenario("GET", "/api/dashboard/timeseries", same("/api/dashboard/timeseries", params={"interval": "month"})),
+    Scenario("GET", "/api/reports/aging", same("/api/reports/aging")),
+    Scenario("GET", "/api/reports/top-debtors", same("/api/reports/top-debtors")),
+    Scenario("GET", "/api/reports/gst-summary", each(lambda ctx: "/api/reports/gst-summary", lambda ctx: {"month": ctx.closed_month})),
+    Scenario("GET", "/api/admin/indexes", same("/api/admin/indexes"), share=0.1),
+    Scenario("GET", "/api/admin/cache", same("/api/admin/cache")),
+    Scenario("GET", "/api/admin/gst-audit", same("/api/admin/gst-audit"), share=0.02),
+    # Writes, each on entities of its own
+    Scenario("POST", "/api/businesses", posting("business_payload")),
+    Scenario("PUT", "/api/businesses/{business_id}", on_fresh("/api/businesses", "business_payload", update("business_payload", "/api/businesses"))),
+    Scenario("DELETE", "/api/businesses/{business_id}", on_fresh("/api/businesses", "business_payload", by_id("/api/businesses"))),
+    Scenario("POST", "/api/business", admin_business_save),
+    Scenario("POST", "/api/business/upload-logo", logo_upload),
+    Scenario("POST", "/api/customers", posting("customer_payload")),
+    Scenario("PUT", "/api/customers/{customer_id}", on_fresh("/api/customers", "customer_payload", update("customer_payload", "/api/customers"))),
+    Scenario("DELETE", "/api/customers/{customer_id}", on_fresh("/api/customers", "customer_payload", by_id("/api/customers"))),
+    Scenario("POST", "/api/customers/import", importing("customer"), share=0.1),
+    Scenario("POST", "/api/products", posting("product_payload")),
+    Scenario("PUT", "/api/products/{product_id}", on_fresh("/api/products", "product_payload", update("product_payload", "/api/products"))),
+    Scenario("DELETE", "/api/products/{product_id}", on_fresh("/api/products", "product_payload", by_id("/api/products"))),
+    Scenario("POST", "/api/products/import", importing("product"), share=0.1),
+    Scenario("POST", "/api/invoices", posting("invoice_payload")),
+    Scenario("PUT", "/api/invoices/{invoice_id}", on_fresh("/api/invoices", "invoice_payload", update("invoice_payload", "/api/invoices"))),
+    Scenario("PUT", "/api/invoices/{invoice_id}/payment", on_fresh("/api/invoices", "invoice_payload", by_id(
+        "/api/invoices", "/payment", params={"payment_status": "fully_paid", "payment_method": "cash"}))),
+    Scenario("DELETE", "/api/invoices/{invoice_id}", on_fresh("/api/invoices", "invoice_payload", by_id("/api/invoices"))),
+    Scenario("POST", "/api/invoices/{invoice_id}/restore", on_fresh(None, None, by_id("/api/invoices", "/restore"), archived=True)),
+    Scenario("POST", "/api/invoices/bulk", bulk_payment),
+    # Last: rebuilds every rollup from the invoices
+    Scenario("POST", "/api/admin/rollups/rebuild", same("/api/admin/rollups/rebuild"), share=0.02),
+]
+
+
+def api_routes(app) -> set:
+    return {
+        f"{method} {route.path}"
+        for route in app.routes
+        if getattr(route, "path", "").startswith("/api")
+        for method in getattr(route, "methods", ()) - {"HEAD"}
+    }
+
+
+async def run_scenario(client, scenario: Scenario, ctx: Context, requests: int, concurrency: int) -> dict:
+    count = max(round(requests * scenario.share), 3)
+    prepared = await scenario.build(ctx, count + WARMUP)
+    prepared = [(url or scenario.route, kwargs) for url, kwargs in prepared]
+    for url, kwargs in prepared[:WARMUP]:
+        await client.request(scenario.method, url, **kwargs)
+
+    queue = list(reversed(prepared[WARMUP:]))
+    samples = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            url, kwargs = queue.pop()
+            started = time.perf_counter()
+            response = await client.request(scenario.method, url, **kwargs)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        **percentiles(samples),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print each endpoint's change against the baseline; returns the regressions"""
+    regressions = []
+    print(f"\n{'endpoint':<52}" + "".join(f"{name:>22}" for name in ("p50_ms", "p95_ms", "p99_ms")))
+    for key, current in results.items():
+        previous = baseline['endpoints'].get(key)
+        if not previous:
+            continue
+        cells = []
+        for name in ("p50_ms", "p95_ms", "p99_ms"):
+            before, after = previous[name], current[name]
+            change = (after - before) / before * 100 if before else 0
+            regressed = change > threshold and after - before >= NOISE_FLOOR_MS
+            if regressed:
+                regressions.append((key, name, before, after))
+            cells.append(f"{before:>8.2f} -> {after:<8.2f}{'!' if regressed else ' '}")
+        print(f"{key:<52}" + "".join(f"{cell:>22}" for cell in cells))
+    return regressions
+
+
+async def run(args):
+    server = load_server(memory=args.memory)
+    if not args.skip_seed:
+        counts = await seed_from_args(server, args)
+        print(f"seeded {', '.join(f'{value} {name}' for name, value in counts.items())}")
+    else:
+        await server.ensure_indexes()
+
+    results = {}
+    async with asgi_client(server.app) as client:
+        ctx = Context(server, client, args.seed)
+        await ctx.load()
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not (args.memory and (scenario.method, scenario.route) in MEMORY_UNSUPPORTED)
+            and (not args.only or any(pattern in scenario.key for pattern in args.only))
+        ]
+        print(f"\n{'endpoint':<52}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}{'rps':>9}{'errors':>8}")
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, ctx, args.requests, args.concurrency)
+            results[scenario.key] = result
+            print(f"{scenario.key:<52}{result['requests']:>6}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                  f"{result['p99_ms']:>9}{result['mean_ms']:>9}{result['throughput_rps']:>9}{result['errors']:>8}")
+
+    if not args.only:
+        uncovered = api_routes(server.app) - {scenario.key for scenario in SCENARIOS}
+        for key in sorted(uncovered):
+            print(f"not benchmarked: {key}")
+
+    run_info = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "backend": "mongomock" if args.memory else os.environ['MONGO_URL'].rsplit("@", 1)[-1],
+            "python": platform.python_version(),
+            "invoices": args.invoices, "customers": args.customers, "products": args.products, "businesses": args.businesses,
+            "seed": args.seed, "requests": args.requests, "concurrency": args.concurrency,
+        },
+        "endpoints": results,
+    }
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps(run_info, indent=2) + "\n")
+        print(f"\nsaved {path}")
+
+    failed = any(result['errors'] for result in results.values())
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for key, name, before, after in regressions:
+            print(f"regression: {key} {name} {before} -> {after} ms")
+        failed = failed or bool(regressions)
+    check_query_budgets()
+    if failed:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument("--skip-seed", action="store_true", help="benchmark the data already in DB_NAME")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="+", help="benchmark endpoints whose 'METHOD /path' contains any of these")
+    parser.add_argument("--save", metavar="NAME", help="store the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="FILE", help="baseline JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="percent slowdown counted as a regression")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
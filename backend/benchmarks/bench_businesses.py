@@ -0,0 +1,80 @@
+"""Latency of GET /api/businesses as the number of businesses grows.
+
+Linked customers are joined with a single ``$lookup`` aggregation, so the
+endpoint should cost roughly the same per returned row at every size instead
+of paying one extra round trip per business. The run fails if the route goes
+over its query budget (server.QUERY_BUDGETS).
+
+    python -m benchmarks.bench_businesses --sizes 100 1000 3000 --customers-per-business 3
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.common import load_server, asgi_client, time_request, summarize, check_query_budgets
+
+
+async def seed(db, businesses: int, customers_per_business: int):
+    await db.businesses.delete_many({})
+    await db.customers.delete_many({})
+
+    now = datetime.now(timezone.utc)
+    business_docs = []
+    customer_docs = []
+    for i in range(businesses):
+        business_id = str(uuid.uuid4())
+        business_docs.append({
+            "id": business_id,
+            "legal_name": f"Business {i:06d}",
+            "gstin": f"27BENCH{i:08d}",
+            "created_at": now,
+            "updated_at": now,
+        })
+        for j in range(customers_per_business):
+            customer_docs.append({
+                "id": str(uuid.uuid4()),
+                "name": f"Customer {i:06d}-{j}",
+                "has_business_with_gst": True,
+                "business_id": business_id,
+                "business_name": f"Business {i:06d}",
+                "created_at": now,
+                "updated_at": now,
+            })
+
+    if business_docs:
+        await db.businesses.insert_many(business_docs)
+    if customer_docs:
+        await db.customers.insert_many(customer_docs)
+
+
+async def run(args):
+    server = load_server(memory=args.memory)
+    await server.db.customers.create_index("business_id")
+
+    print(f"{'businesses':>10} {'rows':>6} {'median ms':>10} {'ms/row':>8}")
+    async with asgi_client(server.app) as client:
+        for size in args.sizes:
+            await seed(server.db, size, args.customers_per_business)
+            samples = await time_request(client, "GET", "/api/businesses", repeat=args.repeat)
+            stats = summarize(samples)
+            rows = min(size, 1000)
+            per_row = stats["median_ms"] / rows if rows else 0
+            print(f"{size:>10} {rows:>6} {stats['median_ms']:>10} {per_row:>8.3f}")
+
+    if not args.memory:
+        await server.client.drop_database(server.db.name)
+    check_query_budgets()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--customers-per-business", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--memory", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cost of turning list documents into a response body, validated vs trusted.
+
+The validated path is what a ``response_model=List[...]`` route does with the
+documents it returns: Pydantic validation of every row (EmailStr checks, nested
+invoice items) and the default JSON encoder. The trusted path is
+``server.trusted_response``: model defaults merged in and orjson encoding. No
+database is involved; both paths get the same in-memory documents.
+
+    python -m benchmarks.bench_serialization --sizes 1000 10000
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from fastapi.routing import serialize_response
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_response_field
+
+from benchmarks.common import load_server, summarize
+
+
+def customer_docs(server, count: int) -> List[dict]:
+    return [
+        server.encode_dates("customers", server.Customer(
+            name=f"Customer {i:06d}",
+            gstin=f"27BENCH{i:08d}",
+            phone_1=f"98{i:08d}",
+            email_1=f"customer{i}@example.com",
+            address_1=f"{i} Market Road",
+            city_1="Pune",
+            state_1="Maharashtra",
+            pincode_1="411001",
+            has_business_with_gst=True,
+            business_name=f"Business {i:06d}",
+        ).model_dump())
+        for i in range(count)
+    ]
+
+
+def invoice_docs(server, count: int, items_per_invoice: int = 5) -> List[dict]:
+    item = server.InvoiceItem(
+        product_name="Cotton shirt", hsn="6205", qty=2, rate=500, total=1000,
+        cgst_percent=2.5, sgst_percent=2.5, cgst_amount=25, sgst_amount=25,
+        taxable_amount=1000, final_amount=1050,
+    ).model_dump()
+    return [
+        server.encode_dates("invoices", server.Invoice(
+            invoice_number=f"INV/2025-26/{i:05d}",
+            customer_id=f"customer-{i % 100}",
+            customer_name=f"Customer {i % 100:06d}",
+            customer_address="1 Market Road, Pune",
+            items=[item] * items_per_invoice,
+            subtotal=1000 * items_per_invoice, total_discount=0,
+            total_cgst=25 * items_per_invoice, total_sgst=25 * items_per_invoice, total_igst=0,
+            total_tax=50 * items_per_invoice, grand_total=1050 * items_per_invoice,
+        ).model_dump())
+        for i in range(count)
+    ]
+
+
+async def validated_body(field, docs: List[dict]) -> bytes:
+    content = await serialize_response(field=field, response_content=docs)
+    return JSONResponse(content).body
+
+
+def trusted_body(server, model, docs: List[dict]) -> bytes:
+    return server.trusted_response(docs, model).body
+
+
+async def run(args):
+    # Nothing is read from the database, so the client never connects
+    server = load_server()
+    datasets = {"customers": (server.Customer, customer_docs), "invoices": (server.Invoice, invoice_docs)}
+
+    print(f"{'collection':>10} {'rows':>6} {'validated ms':>13} {'trusted ms':>11} {'speedup':>8}")
+    for name, (model, make_docs) in datasets.items():
+        field = create_response_field(name=f"response_{name}", type_=List[model])
+        for size in args.sizes:
+            docs = make_docs(server, size)
+            validated, trusted = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await validated_body(field, docs)
+                validated.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                trusted_body(server, model, docs)
+                trusted.append((time.perf_counter() - start) * 1000)
+            validated_ms = summarize(validated)["median_ms"]
+            trusted_ms = summarize(trusted)["median_ms"]
+            speedup = validated_ms / trusted_ms if trusted_ms else 0
+            print(f"{name:>10} {size:>6} {validated_ms:>13} {trusted_ms:>11} {speedup:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import sys
+import math
+import time
+import logging
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'billing_bench')
+
+
+def load_server(memory: bool = False):
+    """Import the app module and point it at the benchmark database"""
+    import server
+
+    if memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--memory requires the mongomock-motor package")
+        server.client = AsyncMongoMockClient(tz_aware=True)
+    server.db = server.client[os.environ['DB_NAME']]
+    # The app logs at INFO; per-request client logging would swamp the results
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    return server
+
+
+def asgi_client(app):
+    """In-process HTTP client that drives the ASGI app without a network hop"""
+    import httpx
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def time_request(client, method: str, url: str, repeat: int = 5, **kwargs):
+    """Issue the same request ``repeat`` times and return the latencies in ms"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return samples
+
+
+def summarize(samples):
+    return {
+        "min_ms": round(min(samples), 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of latency samples in ms, e.g. {"p50_ms": ..., "p95_ms": ...}"""
+    ordered = sorted(samples)
+    return {f"p{point}_ms": round(ordered[max(math.ceil(point / 100 * len(ordered)) - 1, 0)], 2) for point in points}
+
+
+def check_query_budgets():
+    """Exit non-zero if any request went over its route's query budget.
+
+    Queries are counted by pymongo command monitoring, so this only checks runs
+    against a real mongod; mongomock (--memory) issues no commands.
+    """
+    import query_stats
+
+    if query_stats.budget_violations:
+        for violation in query_stats.budget_violations:
+            print(f"over query budget: {violation['route']} issued {violation['queries']} queries, budget {violation['budget']}")
+        raise SystemExit(1)
@@ -0,0 +1,319 @@
+"""Query-plan regression check: no collection scans or blocking sorts on hot routes.
+
+Drives the hot routes (invoice and customer lists, dashboard stats, id lookups and
+GSTIN lookups) against a seeded database while a pymongo command listener records
+the exact command each one sends, then runs explain (executionStats) on every
+recorded command. Reported per query: the winning plan, keys and documents examined
+against documents returned, and whether it sorted in memory.
+
+A COLLSCAN, or a sort the index should have provided (a SORT plan stage, or a $sort
+pipeline stage before any $group, in the pipeline or any of its $facet sub-pipelines),
+fails the check; the exception is a read of any
+one document (empty filter, limit 1), like the admin business lookup. --json prints
+the report as JSON and --output writes it to a file; the exit status is 1 when any
+query failed. Needs a real mongod: mongomock has no explain.
+
+    python -m benchmarks.query_plans --invoices 20000 --output plans.json
+    python -m benchmarks.query_plans --skip-seed --json
+"""
+import argparse
+import asyncio
+import copy
+import json
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from bson import json_util
+from pymongo import monitoring
+
+from benchmarks.bench_api import Context
+from benchmarks.common import load_server, asgi_client
+from benchmarks.seed import add_seed_arguments, seed_from_args
+
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Fields the driver adds that explain rejects or that don't belong to the query
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern",
+                 "apiVersion", "apiStrict", "apiDeprecationErrors"}
+# Pipeline stages after which documents are computed results, so sorting them is expected.
+# $facet is not one: each of its sub-pipelines is checked like a pipeline of its own.
+GROUPING_STAGES = {"$group", "$bucket", "$bucketAuto", "$sortByCount", "$count"}
+PAGE_SIZE = 10
+
+current_probe: ContextVar[Optional[str]] = ContextVar("current_probe", default=None)
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keeps every explainable command sent while a probe is running"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        probe = current_probe.get()
+        if probe is None or event.command_name not in EXPLAINABLE:
+            return
+        command = {
+            key: copy.deepcopy(value) for key, value in event.command.items()
+            if not key.startswith("$") and key not in DRIVER_FIELDS
+        }
+        # Write commands can only be explained one statement at a time
+        statements = {"update": "updates", "delete": "deletes"}.get(event.command_name)
+        if statements:
+            for statement in command[statements]:
+                self.commands.append((probe, event.command_name, {**command, statements: [statement]}))
+        else:
+            self.commands.append((probe, event.command_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class Probe:
+    """One request to a hot route: ``build(ctx)`` returns (url, request kwargs). A paged
+    probe asks for small pages and is recorded on its second, which adds the keyset
+    cursor to the filter."""
+
+    def __init__(self, label: str, method: str, build, paged: bool = False):
+        self.label = label
+        self.method = method
+        self.build = build
+        self.paged = paged
+
+
+def get(url, params=None):
+    return lambda ctx: (url(ctx) if callable(url) else url, {"params": params(ctx) if callable(params) else params or {}})
+
+
+def post_customer(gstin):
+    def build(ctx):
+        payload = ctx.customer_payload()
+        payload.update(has_business_with_gst=True, business_data={"legal_name": f"{payload['name']} Traders", "gstin": gstin(ctx)})
+        return "/api/customers", {"json": payload}
+    return build
+
+
+def import_customers(ctx):
+    gstins = [customer['gstin'] for customer in ctx.customers if customer.get('gstin')][:20]
+    lines = ["name,has_business_with_gst,business_legal_name,business_gstin"]
+    lines += [f"Plan Customer {i},true,Plan Business {i},{gstin}" for i, gstin in enumerate(gstins)]
+    return "/api/customers/import", {"files": {"file": ("customers.csv", "\n".join(lines).encode(), "text/csv")}}
+
+
+def linked_gstin(ctx):
+    return next(customer['gstin'] for customer in ctx.customers if customer.get('gstin'))
+
+
+def new_gstin(ctx):
+    return f"27PLAN{ctx.unique():09d}"
+
+
+def search_word(ctx):
+    return ctx.customers[0]['name'].split()[0]
+
+
+PROBES = [
+    Probe("invoice list", "GET", get("/api/invoices")),
+    Probe("invoice list, next page", "GET", get("/api/invoices"), paged=True),
+    Probe("invoice list, summary view", "GET", get("/api/invoices", {"view": "summary"})),
+    Probe("invoice list, date range", "GET", get("/api/invoices", lambda ctx: {"start_date": ctx.month_start, "end_date": ctx.day})),
+    Probe("invoice list, by invoice date", "GET", get("/api/invoices", {"sort_by": "invoice_date", "sort_order": "asc"}), paged=True),
+    Probe("invoice list, by grand total", "GET", get("/api/invoices", {"sort_by": "grand_total"}), paged=True),
+    Probe("invoice list, search", "GET", get("/api/invoices", lambda ctx: {"search": search_word(ctx)})),
+    Probe("invoice archives", "GET", get("/api/invoices", {"include_deleted": "true"})),
+    Probe("customer list", "GET", get("/api/customers")),
+    Probe("customer list, next page", "GET", get("/api/customers"), paged=True),
+    Probe("customer list, by name", "GET", get("/api/customers", {"sort_by": "name", "sort_order": "asc"}), paged=True),
+    Probe("customer list, search", "GET", get("/api/customers", lambda ctx: {"search": search_word(ctx)})),
+    Probe("dashboard stats", "GET", get("/api/dashboard/stats")),
+    Probe("dashboard stats, date range", "GET", get("/api/dashboard/stats", lambda ctx: {"start_date": ctx.month_start, "end_date": ctx.day})),
+    Probe("invoice by id", "GET", get(lambda ctx: f"/api/invoices/{ctx.pick(ctx.invoice_ids)}")),
+    Probe("invoice pdf", "GET", get(lambda ctx: f"/api/invoices/{ctx.pick(ctx.invoice_ids)}/pdf")),
+    Probe("customer by id", "GET", get(lambda ctx: f"/api/customers/{ctx.pick(ctx.customers)['id']}")),
+    Probe("customer statement", "GET", get(lambda ctx: f"/api/customers/{ctx.pick(ctx.customers)['id']}/statement")),
+    Probe("product by id", "GET", get(lambda ctx: f"/api/products/{ctx.pick(ctx.products)['id']}")),
+    Probe("business by id", "GET", get(lambda ctx: f"/api/businesses/{ctx.pick(ctx.business_ids)}")),
+    Probe("customer with an existing GSTIN", "POST", post_customer(linked_gstin)),
+    Probe("customer with a new GSTIN", "POST", post_customer(new_gstin)),
+    Probe("customer import, GSTIN matching", "POST", import_customers),
+]
+
+
+def _nodes(value):
+    """Every object nested anywhere in an explain document"""
+    if isinstance(value, dict):
+        yield value
+        for child in value.values():
+            yield from _nodes(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _nodes(child)
+
+
+def _children(plan: dict) -> list:
+    return [plan['inputStage']] if 'inputStage' in plan else plan.get('inputStages', [])
+
+
+def describe_plan(plan: dict) -> str:
+    """e.g. LIMIT <- FETCH <- IXSCAN(sort_created_at)"""
+    plan = plan.get('queryPlan', plan)  # slot-based engine plans nest the tree
+    name = plan.get('stage', "?") + (f"({plan['indexName']})" if plan.get('indexName') else "")
+    children = [describe_plan(child) for child in _children(plan)]
+    if not children:
+        return name
+    return f"{name} <- {children[0]}" if len(children) == 1 else f"{name} <- [{', '.join(children)}]"
+
+
+def _is_blocking_sort(node: dict) -> bool:
+    """A SORT stage over documents from the collection, not over grouped results"""
+    return node.get('stage') == "SORT" and not any(
+        child.get('stage') == "GROUP" for stage in _children(node) for child in _nodes(stage)
+    )
+
+
+def query_parts(command_name: str, command: dict) -> dict:
+    if command_name == "find":
+        parts = {"filter": command.get('filter', {}), "sort": command.get('sort'), "projection": command.get('projection'), "limit": command.get('limit')}
+    elif command_name == "aggregate":
+        parts = {"pipeline": command['pipeline']}
+    elif command_name == "findAndModify":
+        parts = {"filter": command.get('query', {}), "sort": command.get('sort'), "projection": command.get('fields')}
+    elif command_name in ("update", "delete"):
+        parts = {"filter": command["updates" if command_name == "update" else "deletes"][0].get('q', {})}
+    else:
+        parts = {"filter": command.get('query', {})}
+    # Relaxed extended JSON, so dates and ids in filters survive json.dumps
+    return json.loads(json_util.dumps({key: value for key, value in parts.items() if value is not None},
+                                      json_options=json_util.RELAXED_JSON_OPTIONS))
+
+
+def _pipeline_sorts_in_memory(stages: list) -> bool:
+    """Whether explained pipeline stages sort documents before any grouping stage"""
+    for stage in stages:
+        name = next(iter(stage))
+        if name == "$facet":
+            # Sub-pipelines read the facet's input documents; its output is one computed document
+            return any(_pipeline_sorts_in_memory(sub_pipeline) for sub_pipeline in stage[name].values())
+        if name in GROUPING_STAGES:
+            return False
+        if name == "$sort":
+            return True
+    return False
+
+
+def analyze(probe: str, command_name: str, command: dict, explain: dict) -> dict:
+    plans = [node['winningPlan'] for node in _nodes(explain) if 'winningPlan' in node]
+    stages = [node for plan in plans for node in _nodes(plan) if 'stage' in node]
+    stats = [node['executionStats'] for node in _nodes(explain) if isinstance(node.get('executionStats'), dict)]
+
+    in_memory_sort = (any(_is_blocking_sort(node) for node in stages)
+                      or _pipeline_sorts_in_memory(explain.get('stages') or []))
+
+    any_document = command_name == "find" and not command.get('filter') and command.get('limit') == 1
+    violations = []
+    if any(node['stage'] == "COLLSCAN" for node in stages) and not any_document:
+        violations.append("COLLSCAN")
+    if in_memory_sort:
+        violations.append("BLOCKING_SORT")
+
+    return {
+        "probe": probe,
+        "collection": command[command_name],
+        "command": command_name,
+        **query_parts(command_name, command),
+        "plan": "; ".join(describe_plan(plan) for plan in plans),
+        "indexes": sorted({node['indexName'] for node in stages if node.get('indexName')}),
+        "keys_examined": sum(stat.get('totalKeysExamined', 0) for stat in stats),
+        "docs_examined": sum(stat.get('totalDocsExamined', 0) for stat in stats),
+        "returned": sum(stat.get('nReturned', 0) for stat in stats),
+        "in_memory_sort": in_memory_sort,
+        "violations": violations,
+    }
+
+
+async def record(client, ctx: Context, recorder: CommandRecorder):
+    for probe in PROBES:
+        url, kwargs = probe.build(ctx)
+        if probe.paged:
+            kwargs['params'] = {**kwargs['params'], "limit": PAGE_SIZE}
+            first = await client.request(probe.method, url, **kwargs)
+            cursor = first.headers.get(ctx.server.NEXT_CURSOR_HEADER)
+            if not cursor:
+                raise SystemExit(f"{probe.label}: no second page; seed more data")
+            kwargs = {**kwargs, "params": {**kwargs['params'], "cursor": cursor}}
+        token = current_probe.set(probe.label)
+        try:
+            response = await client.request(probe.method, url, **kwargs)
+        finally:
+            current_probe.reset(token)
+        if response.status_code >= 400:
+            raise SystemExit(f"{probe.label}: {probe.method} {url} returned {response.status_code}: {response.text[:200]}")
+
+
+async def run(args):
+    if args.memory:
+        raise SystemExit("explain needs a real mongod; mongomock has no query planner")
+    recorder = CommandRecorder()
+    # Before the app module creates its client, which picks up registered listeners
+    monitoring.register(recorder)
+    server = load_server()
+    if not args.skip_seed:
+        await seed_from_args(server, args)
+    else:
+        await server.ensure_indexes()
+
+    async with asgi_client(server.app) as client:
+        ctx = Context(server, client, args.seed)
+        await ctx.load()
+        await record(client, ctx, recorder)
+
+    queries = []
+    seen = set()
+    for probe, command_name, command in recorder.commands:
+        key = (probe, json_util.dumps(command))
+        if key in seen:
+            continue
+        seen.add(key)
+        explain = await server.db.command({"explain": command, "verbosity": "executionStats"})
+        queries.append(analyze(probe, command_name, command, explain))
+
+    build_info = await server.db.command("buildInfo")
+    failures = [query for query in queries if query['violations']]
+    report = {
+        "ok": not failures,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "mongodb": build_info.get('version'),
+        "queries": queries,
+        "failures": len(failures),
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for query in queries:
+            status = ",".join(query['violations']) or "ok"
+            print(f"{status:<22}{query['probe']:<36}{query['command']} {query['collection']}: {query['plan']} "
+                  f"(keys {query['keys_examined']}, docs {query['docs_examined']}, returned {query['returned']})")
+        print(f"\n{len(queries)} queries, {len(failures)} failing")
+    if failures:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument("--skip-seed", action="store_true", help="check the data already in DB_NAME")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", metavar="FILE", help="also write the JSON report to FILE")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
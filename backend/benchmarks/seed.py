@@ -0,0 +1,279 @@
+"""Deterministic synthetic data for benchmarks: businesses, customers, products and
+invoices at any scale from a thousand to a million documents.
+
+The same --seed and counts always produce the same documents (ids included). Invoices
+get 1-15 line items (most have a few), are priced by the GST engine, spread over
+--days days ending on --end-date, and numbered in the app's invoice series.
+Rollups, customer balances and the invoice counters are rebuilt afterwards, so every
+endpoint sees a consistent database.
+
+    python -m benchmarks.seed --invoices 100000
+    python -m benchmarks.seed --invoices 1000000 --customers 50000 --products 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import load_server
+
+STATES = [
+    ("27", "Maharashtra", ["Mumbai", "Pune", "Nagpur"]),
+    ("29", "Karnataka", ["Bengaluru", "Mysuru"]),
+    ("07", "Delhi", ["New Delhi"]),
+    ("24", "Gujarat", ["Ahmedabad", "Surat"]),
+    ("33", "Tamil Nadu", ["Chennai", "Coimbatore"]),
+]
+PRODUCT_KINDS = [
+    ("T-shirt", "6109", 5), ("Track pants", "6103", 12), ("Jersey", "6110", 12),
+    ("Shorts", "6203", 5), ("Jacket", "6201", 18), ("Socks", "6115", 5), ("Cap", "6505", 18),
+]
+FIRST_NAMES = ["Ravi", "Anita", "Suresh", "Priya", "Arjun", "Meena", "Vikram", "Kavya", "Rahul", "Sneha"]
+LAST_NAMES = ["Kumar", "Sharma", "Patel", "Iyer", "Reddy", "Nair", "Joshi", "Gupta", "Rao", "Singh"]
+# Line items per invoice and how common each count is
+LINE_COUNTS = [1, 2, 3, 4, 5, 6, 8, 10, 15]
+LINE_WEIGHTS = [30, 20, 15, 10, 8, 6, 5, 4, 2]
+PAYMENT_STATUSES = ["fully_paid", "partial", "unpaid"]
+PAYMENT_WEIGHTS = [60, 15, 25]
+ARCHIVED_SHARE = 0.05
+
+
+class Seeder:
+    def __init__(self, server, seed: int, end_date: datetime, days: int, batch_size: int):
+        self.server = server
+        self.db = server.db
+        self.rng = random.Random(seed)
+        self.end_date = end_date
+        self.days = days
+        self.batch_size = batch_size
+        # Highest invoice sequence issued per series
+        self.sequences = {}
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self) -> datetime:
+        """A moment within the seeded period, to the millisecond like stored dates"""
+        offset = self.rng.randrange(self.days * 86400 * 1000)
+        return self.end_date - timedelta(milliseconds=offset)
+
+    def gstin(self, state_code: str, number: int) -> str:
+        return f"{state_code}AAAAA{number:05d}"[:11] + f"{number % 10}Z{number % 7}"[:4]
+
+    async def insert(self, collection_name: str, docs):
+        """Insert generated documents in batches; returns how many were written"""
+        written = 0
+        batch = []
+        for doc in docs:
+            batch.append(self.server.encode_dates(collection_name, self.server.with_search_tokens(collection_name, doc)))
+            if len(batch) >= self.batch_size:
+                await self.db[collection_name].insert_many(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if batch:
+            await self.db[collection_name].insert_many(batch, ordered=False)
+            written += len(batch)
+        return written
+
+    def businesses(self, count: int):
+        for i in range(count):
+            state_code, state, cities = STATES[0] if i == 0 else self.rng.choice(STATES)
+            created = self.timestamp()
+            yield {
+                "id": self.uuid(),
+                # The first business is the admin business the invoices are issued by
+                "legal_name": "Bench Sports Pvt Ltd" if i == 0 else f"Business {i:07d}",
+                "gstin": self.gstin(state_code, i),
+                "state_code": state_code,
+                "state": state,
+                "city": self.rng.choice(cities),
+                "pincode": f"{self.rng.randrange(110000, 700000)}",
+                "phone_1": f"9{self.rng.randrange(10 ** 9):09d}",
+                "email_1": f"accounts{i}@example.com",
+                "address_1": f"{self.rng.randrange(1, 500)} Industrial Estate",
+                "created_at": created,
+                "updated_at": created,
+                "version": 0,
+            }
+
+    def customers(self, count: int, businesses: list):
+        for i in range(count):
+            state_code, state, cities = self.rng.choice(STATES)
+            created = self.timestamp()
+            business = self.rng.choice(businesses) if businesses and self.rng.random() < 0.5 else None
+            yield {
+                "id": self.uuid(),
+                "name": f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {i:07d}",
+                "phone_1": f"8{self.rng.randrange(10 ** 9):09d}",
+                "email_1": f"customer{i}@example.com",
+                "address_1": f"{self.rng.randrange(1, 900)} Market Road",
+                "city_1": self.rng.choice(cities),
+                "state_1": state,
+                "pincode_1": f"{self.rng.randrange(110000, 700000)}",
+                "gstin": business['gstin'] if business else None,
+                "has_business_with_gst": business is not None,
+                "business_id": business['id'] if business else None,
+                "business_name": business['legal_name'] if business else "NA",
+                "created_at": created,
+                "updated_at": created,
+                "version": 0,
+            }
+
+    def products(self, count: int):
+        for i in range(count):
+            kind, hsn, gst_rate = self.rng.choice(PRODUCT_KINDS)
+            created = self.timestamp()
+            yield {
+                "id": self.uuid(),
+                "name": f"{kind} {i:06d}",
+                "category": kind,
+                "hsn": hsn,
+                "gst_rate": gst_rate,
+                "default_rate": float(self.rng.randrange(199, 4999)),
+                "uom": "pcs",
+                "created_at": created,
+                "updated_at": created,
+                "version": 0,
+            }
+
+    def invoice(self, customer: dict, products: list, invoice_date: datetime, number: str) -> dict:
+        items = []
+        for product in self.rng.sample(products, min(self.rng.choices(LINE_COUNTS, LINE_WEIGHTS)[0], len(products))):
+            qty = self.rng.randrange(1, 25)
+            rate = product['default_rate']
+            discount = round(qty * rate * self.rng.choice([0, 0, 0, 0.05, 0.1]), 2)
+            items.append({
+                "product_name": product['name'], "hsn": product['hsn'], "qty": qty, "uom": "pcs",
+                "rate": rate, "discount_amount": discount,
+                "rate_mode": self.rng.choice(["with_gst", "without_gst"]),
+                # The engine reads the combined rate from the percents
+                "cgst_percent": product['gst_rate'] / 2, "sgst_percent": product['gst_rate'] / 2,
+            })
+        status = self.rng.choices(PAYMENT_STATUSES, PAYMENT_WEIGHTS)[0]
+        archived = self.rng.random() < ARCHIVED_SHARE
+        created = invoice_date + timedelta(minutes=self.rng.randrange(0, 600))
+        return {
+            "id": self.uuid(),
+            "invoice_number": number,
+            "invoice_date": invoice_date,
+            "customer_id": customer['id'],
+            "customer_name": customer['name'],
+            "customer_gstin": customer['gstin'],
+            "customer_address": customer['address_1'],
+            "customer_phone": customer['phone_1'],
+            "items": items,
+            "payment_status": status,
+            "payment_method": self.rng.choice(["cash", "upi", "bank_transfer"]) if status != "unpaid" else None,
+            "notes": None,
+            "is_deleted": archived,
+            "deleted_at": created if archived else None,
+            "created_at": created,
+            "updated_at": created,
+            "version": 0,
+        }
+
+    def settle(self, invoice: dict):
+        """Payment fields once the engine has priced the invoice"""
+        status = invoice['payment_status']
+        if status == "fully_paid":
+            invoice['paid_amount'], invoice['balance_due'] = invoice['grand_total'], 0
+        elif status == "partial":
+            invoice['paid_amount'] = round(invoice['grand_total'] * self.rng.choice([0.25, 0.5, 0.75]), 2)
+            invoice['balance_due'] = round(invoice['grand_total'] - invoice['paid_amount'], 2)
+        else:
+            invoice['paid_amount'], invoice['balance_due'] = 0, 0
+
+    def invoices(self, count: int, customers: list, products: list, admin: dict):
+        # Dates first, so numbers within each series follow the invoice dates
+        dates = sorted(self.end_date.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.rng.randrange(self.days))
+                       for _ in range(count))
+        sequences = self.sequences
+        batch = []
+        for invoice_date in dates:
+            series = self.server.invoice_series(invoice_date)
+            sequences[series] = sequences.get(series, 0) + 1
+            batch.append(self.invoice(self.rng.choice(customers), products, invoice_date, f"{series}{sequences[series]:05d}"))
+            if len(batch) >= self.batch_size:
+                yield from self._priced(batch, admin)
+                batch = []
+        yield from self._priced(batch, admin)
+
+    def _priced(self, batch: list, admin: dict):
+        self.server.gst.price_invoices(batch, admin)
+        for invoice in batch:
+            self.settle(invoice)
+            yield invoice
+
+
+async def seed(server, invoices: int, customers: int = None, products: int = None, businesses: int = None,
+               seed_value: int = 42, end_date: datetime = None, days: int = 730, batch_size: int = 5000) -> dict:
+    """Replace the benchmark database contents with generated data; returns the counts"""
+    customers = customers if customers is not None else max(invoices // 10, 10)
+    products = products if products is not None else max(min(invoices // 50, 5000), 10)
+    businesses = businesses if businesses is not None else max(invoices // 20, 1)
+    end_date = end_date or datetime(2026, 3, 31, 23, 59, tzinfo=timezone.utc)
+
+    db = server.db
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+    await server.ensure_indexes()
+
+    seeder = Seeder(server, seed_value, end_date, days, batch_size)
+    started = time.perf_counter()
+    # Generated lists are kept (small, and the next collections pick from them);
+    # invoices are streamed in batches
+    business_docs = list(seeder.businesses(businesses))
+    customer_docs = list(seeder.customers(customers, business_docs[1:]))
+    product_docs = list(seeder.products(products))
+    admin = dict(business_docs[0])
+    counts = {
+        "businesses": await seeder.insert("businesses", business_docs),
+        "customers": await seeder.insert("customers", customer_docs),
+        "products": await seeder.insert("products", product_docs),
+    }
+    counts["invoices"] = await seeder.insert("invoices", seeder.invoices(invoices, customer_docs, product_docs, admin))
+
+    await server.rebuild_daily_sales()
+    await server.rebuild_customer_balances()
+    # Every series, not just the current one server.seed_invoice_counter() starts
+    for series, seq in seeder.sequences.items():
+        await db.counters.update_one({"_id": f"invoice:{series}"}, {"$max": {"seq": seq}}, upsert=True)
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--customers", type=int, help="default: invoices / 10")
+    parser.add_argument("--products", type=int, help="default: invoices / 50, at most 5000")
+    parser.add_argument("--businesses", type=int, help="default: invoices / 20")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=lambda value: datetime.fromisoformat(value).replace(tzinfo=timezone.utc),
+                        default=datetime(2026, 3, 31, 23, 59, tzinfo=timezone.utc))
+    parser.add_argument("--days", type=int, default=730, help="invoice dates span this many days up to --end-date")
+    parser.add_argument("--memory", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+
+
+async def seed_from_args(server, args) -> dict:
+    return await seed(
+        server, args.invoices, args.customers, args.products, args.businesses,
+        seed_value=args.seed, end_date=args.end_date, days=args.days,
+    )
+
+
+async def run(args):
+    server = load_server(memory=args.memory)
+    counts = await seed_from_args(server, args)
+    print(", ".join(f"{value} {name}" for name, value in counts.items() if name != "seconds") + f" in {counts['seconds']} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
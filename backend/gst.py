@@ -0,0 +1,229 @@
+"""GST computation in integer paise.
+
+compute_lines() works on NumPy arrays of line items, so the same code prices one
+invoice when it is written and millions of stored lines in audit_invoices().
+Amounts are rounded half away from zero to the paisa; the tax on a line is split
+between CGST and SGST with any odd paisa going to CGST.
+"""
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+INCLUSIVE = "with_gst"  # rate includes GST; the taxable value is backed out of it
+EXCLUSIVE = "without_gst"  # GST is added on top of the rate
+
+LINE_FIELDS = ("taxable_amount", "cgst_amount", "sgst_amount", "igst_amount", "final_amount")
+TOTAL_FIELDS = ("subtotal", "total_discount", "total_cgst", "total_sgst", "total_igst", "total_tax", "grand_total")
+
+# Stored amounts were computed by the client in floating point, so each line may be
+# a paisa off; invoice totals may be off by up to a paisa per line
+LINE_TOLERANCE_PAISE = 1
+
+
+def state_code(value: Optional[str]) -> Optional[str]:
+    """Two-digit GST state code from a state code or a GSTIN (its first two digits)"""
+    digits = re.match(r"\s*(\d{1,2})", value or "")
+    return digits.group(1).zfill(2) if digits else None
+
+
+def is_interstate(business: Optional[dict], customer_gstin: Optional[str]) -> Optional[bool]:
+    """Whether a supply is inter-state (IGST); None when either state is unknown"""
+    supplier = business and (state_code(business.get('state_code')) or state_code(business.get('gstin')))
+    recipient = state_code(customer_gstin)
+    if not supplier or not recipient:
+        return None
+    return supplier != recipient
+
+
+def to_paise(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    # The epsilon keeps amounts like 1.005 (stored as 1.00499...) rounding up
+    return (np.sign(values) * np.floor(np.abs(values) * 100 + 0.5 + 1e-6)).astype(np.int64)
+
+
+def _divide(numerator: np.ndarray, denominator) -> np.ndarray:
+    """numerator / denominator rounded half away from zero, in integers"""
+    quotient = (2 * np.abs(numerator) + denominator) // (2 * denominator)
+    return np.sign(numerator) * quotient
+
+
+def compute_lines(qty, rate, discount, gst_rate, inclusive, interstate) -> dict:
+    """Paise amounts for line items given as parallel arrays.
+
+    gst_rate is the combined rate in percent; inclusive and interstate are boolean
+    arrays. Returns int64 arrays keyed like the InvoiceItem amount fields.
+    """
+    total = to_paise(np.asarray(qty, dtype=np.float64) * np.asarray(rate, dtype=np.float64))
+    discount = to_paise(discount)
+    basis_points = np.rint(np.asarray(gst_rate, dtype=np.float64) * 100).astype(np.int64)
+    inclusive = np.asarray(inclusive, dtype=bool)
+    interstate = np.asarray(interstate, dtype=bool)
+
+    value = total - discount
+    taxable = np.where(inclusive, _divide(value * 10000, 10000 + basis_points), value)
+    tax = np.where(inclusive, value - taxable, _divide(taxable * basis_points, 10000))
+    cgst = np.where(interstate, 0, tax - tax // 2)
+    sgst = np.where(interstate, 0, tax // 2)
+    igst = np.where(interstate, tax, 0)
+    return {
+        "total": total,
+        "discount_amount": discount,
+        "taxable_amount": taxable,
+        "cgst_amount": cgst,
+        "sgst_amount": sgst,
+        "igst_amount": igst,
+        "final_amount": taxable + tax,
+    }
+
+
+def item_gst_rate(item: dict) -> float:
+    return item.get('igst_percent') or (item.get('cgst_percent') or 0) + (item.get('sgst_percent') or 0)
+
+
+def item_is_inclusive(item: dict) -> bool:
+    """Items saved before rate_mode was stored: inclusive when the final amount is the
+    rate times quantity less discount, i.e. GST was not added on top"""
+    if item.get('rate_mode'):
+        return item['rate_mode'] == INCLUSIVE
+    value = (item.get('qty') or 0) * (item.get('rate') or 0) - (item.get('discount_amount') or 0)
+    return abs((item.get('final_amount') or 0) - value) < 0.01
+
+
+def invoice_is_interstate(invoice: dict, business: Optional[dict]) -> bool:
+    interstate = is_interstate(business, invoice.get('customer_gstin'))
+    if interstate is None:
+        # Unknown state on either side: keep the treatment the invoice was entered with
+        interstate = any(item.get('igst_percent') for item in invoice.get('items') or [])
+    return interstate
+
+
+def _line_arrays(items: List[dict], interstate) -> dict:
+    return compute_lines(
+        [item.get('qty') or 0 for item in items],
+        [item.get('rate') or 0 for item in items],
+        [item.get('discount_amount') or 0 for item in items],
+        [item_gst_rate(item) for item in items],
+        [item_is_inclusive(item) for item in items],
+        interstate,
+    )
+
+
+def price_invoices(invoices: List[dict], business: Optional[dict]) -> List[dict]:
+    """Recompute the line and total amounts of invoices in place (rupees, exact to the
+    paisa); all their lines are priced in one vectorized pass"""
+    supply = [invoice_is_interstate(invoice, business) for invoice in invoices]
+    items, owner = [], []
+    for position, invoice in enumerate(invoices):
+        for item in invoice.get('items') or []:
+            items.append(item)
+            owner.append(position)
+    lines = _line_arrays(items, [supply[position] for position in owner])
+
+    totals = [dict.fromkeys(lines, 0) for _ in invoices]
+    for index, item in enumerate(items):
+        interstate = supply[owner[index]]
+        gst_rate = item_gst_rate(item)
+        item['rate_mode'] = INCLUSIVE if item_is_inclusive(item) else EXCLUSIVE
+        item['cgst_percent'] = 0 if interstate else gst_rate / 2
+        item['sgst_percent'] = 0 if interstate else gst_rate / 2
+        item['igst_percent'] = gst_rate if interstate else 0
+        invoice_totals = totals[owner[index]]
+        for field, amounts in lines.items():
+            amount = int(amounts[index])
+            item[field] = amount / 100
+            invoice_totals[field] += amount
+
+    for invoice, invoice_totals in zip(invoices, totals):
+        tax = invoice_totals['cgst_amount'] + invoice_totals['sgst_amount'] + invoice_totals['igst_amount']
+        invoice.update({
+            "subtotal": invoice_totals['total'] / 100,
+            "total_discount": invoice_totals['discount_amount'] / 100,
+            "total_cgst": invoice_totals['cgst_amount'] / 100,
+            "total_sgst": invoice_totals['sgst_amount'] / 100,
+            "total_igst": invoice_totals['igst_amount'] / 100,
+            "total_tax": tax / 100,
+            "grand_total": invoice_totals['final_amount'] / 100,
+        })
+    return invoices
+
+
+def price_invoice(invoice: dict, business: Optional[dict]) -> dict:
+    """Recompute one invoice's line and total amounts in place"""
+    return price_invoices([invoice], business)[0]
+
+
+def _difference(stored, expected) -> dict:
+    return {"stored": int(stored) / 100, "expected": int(expected) / 100}
+
+
+def audit_invoices(invoices: Iterable[dict], business: Optional[dict]) -> List[dict]:
+    """Recompute a batch of stored invoices at once and describe every one whose stored
+    line amounts or totals differ from the engine's by more than the tolerance"""
+    invoices = list(invoices)
+    if not invoices:
+        return []
+    supply = [invoice_is_interstate(invoice, business) for invoice in invoices]
+    items, owner = [], []
+    for position, invoice in enumerate(invoices):
+        for item in invoice.get('items') or []:
+            items.append(item)
+            owner.append(position)
+
+    owner = np.asarray(owner, dtype=np.int64)
+    expected = _line_arrays(items, [supply[position] for position in owner])
+    stored = {field: to_paise([item.get(field) or 0 for item in items]) for field in LINE_FIELDS}
+    line_mismatch = np.zeros(len(items), dtype=bool)
+    for field in LINE_FIELDS:
+        line_mismatch |= np.abs(stored[field] - expected[field]) > LINE_TOLERANCE_PAISE
+
+    def per_invoice(amounts: np.ndarray) -> np.ndarray:
+        # Exact: paise totals stay far below 2**53
+        return np.rint(np.bincount(owner, weights=amounts, minlength=len(invoices))).astype(np.int64)
+
+    line_sums = {field: per_invoice(amounts) for field, amounts in expected.items()}
+    expected_totals = {
+        "subtotal": line_sums['total'],
+        "total_discount": line_sums['discount_amount'],
+        "total_cgst": line_sums['cgst_amount'],
+        "total_sgst": line_sums['sgst_amount'],
+        "total_igst": line_sums['igst_amount'],
+        "total_tax": line_sums['cgst_amount'] + line_sums['sgst_amount'] + line_sums['igst_amount'],
+        "grand_total": line_sums['final_amount'],
+    }
+    tolerance = np.maximum(np.bincount(owner, minlength=len(invoices)), 1) * LINE_TOLERANCE_PAISE
+    stored_totals = {field: to_paise([invoice.get(field) or 0 for invoice in invoices]) for field in TOTAL_FIELDS}
+    invoice_mismatch = np.zeros(len(invoices), dtype=bool)
+    for field in TOTAL_FIELDS:
+        invoice_mismatch |= np.abs(stored_totals[field] - expected_totals[field]) > tolerance
+    invoice_mismatch[owner[line_mismatch]] = True
+
+    reports = []
+    starts = np.searchsorted(owner, np.arange(len(invoices)))
+    for position in np.flatnonzero(invoice_mismatch):
+        invoice = invoices[position]
+        totals = {
+            field: _difference(stored_totals[field][position], expected_totals[field][position])
+            for field in TOTAL_FIELDS
+            if abs(stored_totals[field][position] - expected_totals[field][position]) > tolerance[position]
+        }
+        lines = []
+        for index in range(starts[position], starts[position] + len(invoice.get('items') or [])):
+            if not line_mismatch[index]:
+                continue
+            lines.append({
+                "line": int(index - starts[position]),
+                **{
+                    field: _difference(stored[field][index], expected[field][index])
+                    for field in LINE_FIELDS
+                    if abs(stored[field][index] - expected[field][index]) > LINE_TOLERANCE_PAISE
+                },
+            })
+        reports.append({
+            "id": invoice.get('id'),
+            "invoice_number": invoice.get('invoice_number'),
+            "interstate": supply[position],
+            "totals": totals,
+            "lines": lines,
+        })
+    return reports
@@ -0,0 +1,206 @@
+"""Invoice PDF rendering.
+
+Kept apart from server.py so that process-pool workers only import reportlab and
+this module: render_invoice_pdf() takes plain dicts and returns the PDF bytes.
+The layout follows InvoiceView.jsx.
+"""
+import io
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Bump when the layout changes so cached PDFs are rendered again
+RENDERER_VERSION = "1"
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+_styles = getSampleStyleSheet()
+TEXT = ParagraphStyle("text", parent=_styles["Normal"], fontSize=9, leading=12, textColor=colors.HexColor("#475569"))
+SMALL = ParagraphStyle("small", parent=TEXT, fontSize=8, leading=10)
+HEADING = ParagraphStyle("heading", parent=_styles["Heading1"], fontSize=18, leading=22, spaceAfter=2)
+LABEL = ParagraphStyle("label", parent=TEXT, fontSize=8, textColor=colors.HexColor("#64748b"))
+NAME = ParagraphStyle("name", parent=TEXT, fontSize=11, leading=14, textColor=colors.HexColor("#1e293b"))
+TITLE = ParagraphStyle("title", parent=HEADING, alignment=TA_RIGHT, textColor=colors.HexColor("#2563eb"))
+RIGHT = ParagraphStyle("right", parent=TEXT, alignment=TA_RIGHT)
+GRID = colors.HexColor("#e2e8f0")
+
+
+def _money(value) -> str:
+    return f"{value or 0:,.2f}"
+
+
+def _date(value) -> str:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo:
+        value = value.astimezone(IST)
+    return value.strftime("%d/%m/%Y")
+
+
+def _lines(style, *lines) -> list:
+    """Paragraphs for the non-empty lines; text is escaped, it is not reportlab markup"""
+    return [Paragraph(escape(line), style) for line in lines if line]
+
+
+def _header(invoice: dict, business: Optional[dict], logo: Optional[bytes]):
+    if business:
+        place = ", ".join(filter(None, [business.get('city'), business.get('state'), business.get('pincode')]))
+        left = [
+            Paragraph(escape(business.get('legal_name') or ""), HEADING),
+            *_lines(
+                TEXT,
+                business.get('gstin') and f"GSTIN: {business['gstin']}",
+                business.get('address_1'),
+                business.get('address_1') and place,
+                business.get('phone_1') and f"Phone: {business['phone_1']}",
+                business.get('email_1') and f"Email: {business['email_1']}",
+                business.get('website') and f"Website: {business['website']}",
+            ),
+        ]
+        if logo:
+            try:
+                width, height = ImageReader(io.BytesIO(logo)).getSize()
+            except Exception:
+                # A logo reportlab cannot read (e.g. SVG) is left out rather than failing the invoice
+                width = height = None
+            if width and height:
+                left.insert(0, Image(io.BytesIO(logo), width=20 * mm * width / height, height=20 * mm, hAlign="LEFT"))
+    else:
+        left = [Paragraph("Invoice", HEADING)]
+
+    right = [
+        Paragraph("Tax Invoice", TITLE),
+        Paragraph(escape(invoice['invoice_number']), RIGHT),
+        Paragraph(f"Date: {_date(invoice['invoice_date'])}", RIGHT),
+    ]
+    table = Table([[left, right]], colWidths=["60%", "40%"])
+    table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LINEBELOW", (0, 0), (-1, 0), 1, colors.HexColor("#cbd5e1")),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+    ]))
+    return table
+
+
+def _parties(invoice: dict):
+    ship_place = ", ".join(filter(None, [invoice.get('customer_ship_city'), invoice.get('customer_ship_state')]))
+    if invoice.get('customer_ship_pincode'):
+        ship_place = f"{ship_place} - {invoice['customer_ship_pincode']}"
+    bill_to = [
+        Paragraph("BILL TO", LABEL),
+        Paragraph(escape(invoice['customer_name']), NAME),
+        *_lines(
+            TEXT,
+            invoice.get('customer_gstin') and f"GSTIN: {invoice['customer_gstin']}",
+            invoice.get('customer_address'),
+            invoice.get('customer_phone') and f"Phone: {invoice['customer_phone']}",
+        ),
+    ]
+    ship_to = [
+        Paragraph("SHIP TO", LABEL),
+        Paragraph(escape(invoice['customer_name']), NAME),
+        *_lines(
+            TEXT,
+            invoice.get('customer_ship_address'),
+            ship_place,
+            invoice.get('customer_phone_2') and f"Phone: {invoice['customer_phone_2']}",
+        ),
+    ]
+    table = Table([[bill_to, ship_to]], colWidths=["50%", "50%"])
+    table.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("TOPPADDING", (0, 0), (-1, -1), 10)]))
+    return table
+
+
+def _items(invoice: dict):
+    header = ["Item", "HSN", "Rate (Rs.)\n(excl. GST)", "Qty", "Item Value\n(Rs.)", "Discount\n(Rs.)",
+              "Taxable\nValue (Rs.)", "Tax", "Item Total\n(Rs.)"]
+    rows = [header]
+    for item in invoice.get('items') or []:
+        qty = item.get('qty') or 0
+        discount = item.get('discount_amount') or 0
+        # taxable_amount = rate * qty - discount_amount
+        item_value = (item.get('taxable_amount') or 0) + discount
+        rate = item_value / qty if qty else 0
+        if item.get('igst_percent'):
+            tax = f"{item['igst_percent']:g}% IGST"
+        else:
+            tax = f"{item.get('cgst_percent') or 0:g}% + {item.get('sgst_percent') or 0:g}%\nCGST + SGST"
+        rows.append([
+            [Paragraph(escape(item['product_name']), TEXT), *_lines(SMALL, item.get('description'))],
+            item.get('hsn') or "-",
+            _money(rate),
+            f"{qty:g}",
+            _money(item_value),
+            _money(discount) if discount > 0 else "-",
+            _money(item.get('taxable_amount')),
+            tax,
+            _money(item.get('final_amount')),
+        ])
+    table = Table(rows, repeatRows=1, colWidths=[44 * mm, 16 * mm, 19 * mm, 12 * mm, 19 * mm, 16 * mm, 19 * mm, 22 * mm, 19 * mm])
+    table.setStyle(TableStyle([
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f1f5f9")),
+        ("ALIGN", (2, 0), (-1, -1), "RIGHT"),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LINEBELOW", (0, 0), (-1, -1), 0.5, GRID),
+    ]))
+    return table
+
+
+def _totals(invoice: dict):
+    rows = [["Subtotal:", f"Rs. {_money(invoice.get('subtotal'))}"]]
+    if (invoice.get('total_discount') or 0) > 0:
+        rows.append(["Discount:", f"-Rs. {_money(invoice['total_discount'])}"])
+    for field, label in (("total_cgst", "CGST:"), ("total_sgst", "SGST:"), ("total_igst", "IGST:")):
+        if (invoice.get(field) or 0) > 0:
+            rows.append([label, f"Rs. {_money(invoice[field])}"])
+    rows.append(["Grand Total:", f"Rs. {_money(invoice.get('grand_total'))}"])
+    table = Table(rows, colWidths=[35 * mm, 35 * mm], hAlign="RIGHT")
+    table.setStyle(TableStyle([
+        ("ALIGN", (1, 0), (1, -1), "RIGHT"),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("FONTSIZE", (0, -1), (-1, -1), 11),
+        ("LINEABOVE", (0, -1), (-1, -1), 1, colors.HexColor("#cbd5e1")),
+    ]))
+    return table
+
+
+def _payment(invoice: dict) -> list:
+    flowables = []
+    if invoice.get('payment_method'):
+        flowables.append(Paragraph(f"Payment Method: <b>{escape(invoice['payment_method'].upper())}</b>", TEXT))
+    flowables.append(Paragraph(f"Payment Status: <b>{escape((invoice.get('payment_status') or 'unpaid').upper())}</b>", TEXT))
+    if invoice.get('notes'):
+        flowables += [Spacer(1, 4 * mm), Paragraph("NOTES", LABEL), *_lines(TEXT, invoice['notes'])]
+    return flowables
+
+
+def render_invoice_pdf(invoice: dict, business: Optional[dict] = None, logo: Optional[bytes] = None) -> bytes:
+    """Render one invoice document (as stored) to PDF bytes"""
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm,
+        title=f"Invoice {invoice['invoice_number']}",
+    )
+    document.build([
+        _header(invoice, business, logo),
+        _parties(invoice),
+        Spacer(1, 6 * mm),
+        _items(invoice),
+        Spacer(1, 4 * mm),
+        _totals(invoice),
+        Spacer(1, 6 * mm),
+        *_payment(invoice),
+        Spacer(1, 8 * mm),
+        Paragraph("Thank you for your business!", ParagraphStyle("footer", parent=SMALL, alignment=1)),
+    ])
+    return buffer.getvalue()
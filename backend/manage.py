@@ -0,0 +1,57 @@
+"""Maintenance commands for the Billing backend.
+
+Run from the backend directory with the same environment (.env) as the app:
+
+    python manage.py rebuild-rollups
+    python manage.py migrate-dates
+    python manage.py audit-gst > gst-audit.ndjson
+"""
+import argparse
+import asyncio
+import json
+
+import server
+
+
+async def rebuild_rollups(args):
+    buckets = await server.rebuild_daily_sales()
+    print(f"Rebuilt daily sales rollups: {buckets} buckets")
+    customers = await server.rebuild_customer_balances()
+    print(f"Rebuilt customer balances: {customers} customers")
+    await server.db.gst_summaries.delete_many({})
+    print("Dropped cached GST summaries")
+
+
+async def migrate_dates(args):
+    migrated = await server.migrate_string_dates()
+    print(f"Migrated {migrated} documents from string timestamps to BSON dates")
+
+
+async def audit_gst(args):
+    async for report in server.audit_gst():
+        print(json.dumps(report))
+
+
+COMMANDS = {
+    "rebuild-rollups": (rebuild_rollups, "recompute the daily sales rollups and customer balances from the invoices, drop cached GST summaries"),
+    "migrate-dates": (migrate_dates, "convert timestamps stored as ISO strings to BSON dates"),
+    "audit-gst": (audit_gst, "recompute every invoice's tax and totals and print the ones that differ (NDJSON)"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Billing backend maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+
+    args = parser.parse_args()
+    handler, _ = COMMANDS[args.command]
+    try:
+        asyncio.run(handler(args))
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    main()
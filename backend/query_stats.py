@@ -0,0 +1,166 @@
+"""Per-request database query accounting.
+
+A pymongo command listener, registered on the Motor client, charges every command
+to the HTTP request that issued it. Motor runs pymongo calls on its executor inside
+a copy of the caller's context, so the request's RequestQueryStats (held in a
+context variable set by QueryStatsMiddleware) is visible from the listener thread.
+
+Counted per request: queries (commands other than getMore), round trips (every
+command, including getMore batches), documents returned and time spent waiting on
+the server. A query shape (command, collection, filter fields) repeated
+N_PLUS_ONE_THRESHOLD times in one request is reported as a likely N+1.
+"""
+import json
+import logging
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("billing.queries")
+
+QUERY_HEADERS = ["X-DB-Queries", "X-DB-Round-Trips", "X-DB-Documents", "X-DB-Time-Ms"]
+
+# Commands that move a cursor rather than start a query
+CURSOR_COMMANDS = {"getMore", "killCursors"}
+
+
+class RequestQueryStats:
+    __slots__ = ("queries", "round_trips", "documents", "db_time_us", "shapes", "_lock")
+
+    def __init__(self):
+        self.queries = 0
+        self.round_trips = 0
+        self.documents = 0
+        self.db_time_us = 0
+        self.shapes = Counter()
+        # Concurrent queries of one request (asyncio.gather) report from different threads
+        self._lock = threading.Lock()
+
+    def repeated_shapes(self, threshold: int) -> Dict[str, int]:
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.queries,
+            "round_trips": self.round_trips,
+            "documents": self.documents,
+            "db_time_ms": round(self.db_time_us / 1000, 2),
+        }
+
+
+current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _query_shape(event: monitoring.CommandStartedEvent) -> str:
+    command = event.command
+    collection = command.get(event.command_name)
+    if event.command_name == "aggregate":
+        stage = (command.get("pipeline") or [{}])[0]
+        query = stage.get("$match") or {}
+    else:
+        query = command.get("filter") or command.get("query") or {}
+    return f"{event.command_name} {collection} {{{','.join(sorted(query))}}}"
+
+
+def _documents_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] is not None else 0
+    if "values" in reply:  # distinct
+        return len(reply["values"])
+    return 0
+
+
+class QueryCounter(monitoring.CommandListener):
+    def started(self, event):
+        stats = current_stats.get()
+        if stats is None:
+            return
+        with stats._lock:
+            stats.round_trips += 1
+            if event.command_name not in CURSOR_COMMANDS:
+                stats.queries += 1
+                stats.shapes[_query_shape(event)] += 1
+
+    def succeeded(self, event):
+        stats = current_stats.get()
+        if stats is None:
+            return
+        documents = _documents_returned(event.reply)
+        with stats._lock:
+            stats.documents += documents
+            stats.db_time_us += event.duration_micros
+
+    def failed(self, event):
+        stats = current_stats.get()
+        if stats is None:
+            return
+        with stats._lock:
+            stats.db_time_us += event.duration_micros
+
+
+listener = QueryCounter()
+
+
+class QueryStatsMiddleware:
+    """Collect RequestQueryStats for each HTTP request, check it against the route's
+    query budget and log it; in debug mode the counts are also sent as X-DB-* headers
+    (as of when the response starts, so a streamed body's later batches are not in them).
+    """
+
+    def __init__(self, app, budgets: Dict[str, int], debug: bool = False, n_plus_one_threshold: int = 5):
+        self.app = app
+        self.budgets = budgets
+        self.debug = debug
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                counts = stats.as_dict()
+                for name, value in zip(QUERY_HEADERS, counts.values()):
+                    headers[name] = str(value)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.debug else send)
+        finally:
+            current_stats.reset(token)
+            self.report(scope, stats)
+
+    def report(self, scope, stats: RequestQueryStats):
+        route = scope.get("route")
+        # The route template, so /api/invoices/{invoice_id} is one budget and one log key
+        key = f"{scope['method']} {route.path if route else scope['path']}"
+        record = {"route": key, **stats.as_dict()}
+        level = logging.INFO if self.debug else logging.DEBUG
+
+        budget = self.budgets.get(key)
+        if budget is not None and stats.queries > budget:
+            record["budget"] = budget
+            level = logging.WARNING
+            budget_violations.append(record)
+        repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+        if repeated:
+            record["repeated_queries"] = repeated
+            level = logging.WARNING
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record))
+
+
+# Recent over-budget requests; benchmark runs fail when any are recorded
+budget_violations = deque(maxlen=1000)
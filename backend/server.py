@@ -1,15 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, Request, Response, Query
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import IndexModel, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
 from typing import List, Optional
+from collections.abc import Mapping
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
 import base64
+import asyncio
+import time
+import hashlib
+import re
+import json
+import csv
+import io
+import itertools
+import unicodedata
+import zipfile
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from invoice_pdf import render_invoice_pdf, RENDERER_VERSION
+import gst
+import query_stats
+import metrics
 
 
 ROOT_DIR = Path(__file__).parent
@@ -17,7 +42,7 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[query_stats.listener, *metrics.listeners])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -56,6 +81,7 @@ class Business(BaseModel):
     logo: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
 
 class BusinessCreate(BaseModel):
     legal_name: str
@@ -107,6 +133,7 @@ class Customer(BaseModel):
     business_name: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
 
 class CustomerCreate(BaseModel):
     name: str
@@ -143,6 +170,7 @@ class Product(BaseModel):
     uom: str = "pcs"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
 
 class ProductCreate(BaseModel):
     name: str
@@ -171,6 +199,7 @@ class InvoiceItem(BaseModel):
     igst_amount: float = 0
     taxable_amount: float
     final_amount: float
+    rate_mode: Optional[str] = None  # "with_gst" or "without_gst"; None on items saved before it was kept
 
 class Invoice(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -208,6 +237,7 @@ class Invoice(BaseModel):
     deleted_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
 
 class InvoiceCreate(BaseModel):
     customer_id: str
@@ -238,638 +268,2398 @@ class InvoiceCreate(BaseModel):
     notes: Optional[str] = None
     invoice_date: Optional[str] = None
 
+class InvoiceBulkRequest(BaseModel):
+    ids: List[str]
+    operation: str  # "payment", "archive" or "restore"
+    payment_status: Optional[str] = None
+    payment_method: Optional[str] = None
 
-# ============ ROUTES ============
 
-@api_router.get("/")
-async def root():
-    return {"message": "Billing App API"}
+# ============ DATES ============
 
+# Timestamps are stored as native BSON dates (UTC) and the client is tz-aware, so reads
+# return datetimes without any parsing. Datetimes without an offset, e.g. a date-only
+# invoice date from the UI, are business-local (IST).
+IST = timezone(timedelta(hours=5, minutes=30))
 
-# Business Routes
-@api_router.post("/businesses", response_model=Business)
-async def create_business(input: BusinessCreate):
-    business_obj = Business(**input.model_dump())
-    doc = business_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.businesses.insert_one(doc)
-    return business_obj
+DATE_FIELDS = {
+    "businesses": ("created_at", "updated_at"),
+    "customers": ("created_at", "updated_at"),
+    "products": ("created_at", "updated_at"),
+    "invoices": ("invoice_date", "created_at", "updated_at", "deleted_at"),
+}
 
-@api_router.get("/businesses")
-async def get_businesses(search: Optional[str] = None, sort_by: Optional[str] = "created_at", sort_order: Optional[str] = "desc"):
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"legal_name": {"$regex": search, "$options": "i"}},
-                {"nickname": {"$regex": search, "$options": "i"}},
-                {"city": {"$regex": search, "$options": "i"}},
-                {"state": {"$regex": search, "$options": "i"}},
-                {"gstin": {"$regex": search, "$options": "i"}},
-            ]
-        }
-    
-    sort_direction = -1 if sort_order == "desc" else 1
-    businesses = await db.businesses.find(query, {"_id": 0}).sort(sort_by, sort_direction).to_list(1000)
-    
-    # Add linked customers count to each business
-    for business in businesses:
-        if isinstance(business['created_at'], str):
-            business['created_at'] = datetime.fromisoformat(business['created_at'])
-        if isinstance(business['updated_at'], str):
-            business['updated_at'] = datetime.fromisoformat(business['updated_at'])
-        
-        # Get linked customers
-        linked_customers = await db.customers.find(
-            {"business_id": business['id']}, 
-            {"_id": 0, "name": 1}
-        ).to_list(1000)
-        business['linked_customers'] = [c['name'] for c in linked_customers]
-        business['linked_customers_count'] = len(linked_customers)
-    
-    return businesses
 
-@api_router.get("/businesses/{business_id}", response_model=Business)
-async def get_business(business_id: str):
-    business = await db.businesses.find_one({"id": business_id}, {"_id": 0})
-    if not business:
-        raise HTTPException(status_code=404, detail="Business not found")
-    
-    if isinstance(business['created_at'], str):
-        business['created_at'] = datetime.fromisoformat(business['created_at'])
-    if isinstance(business['updated_at'], str):
-        business['updated_at'] = datetime.fromisoformat(business['updated_at'])
-    
-    return Business(**business)
+def to_utc(value) -> datetime:
+    """UTC datetime of an ISO string or datetime, truncated to what BSON stores (milliseconds)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not value.tzinfo:
+        value = value.replace(tzinfo=IST)
+    value = value.astimezone(timezone.utc)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
 
-@api_router.put("/businesses/{business_id}", response_model=Business)
-async def update_business(business_id: str, input: BusinessCreate):
-    business = await db.businesses.find_one({"id": business_id}, {"_id": 0})
-    if not business:
-        raise HTTPException(status_code=404, detail="Business not found")
-    
-    business_dict = input.model_dump()
-    business_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-    business_dict['id'] = business['id']
-    business_dict['created_at'] = business['created_at']
-    
-    await db.businesses.update_one({"id": business_id}, {"$set": business_dict})
-    
-    if isinstance(business_dict['created_at'], str):
-        business_dict['created_at'] = datetime.fromisoformat(business_dict['created_at'])
-    if isinstance(business_dict['updated_at'], str):
-        business_dict['updated_at'] = datetime.fromisoformat(business_dict['updated_at'])
-    
-    return Business(**business_dict)
 
-@api_router.delete("/businesses/{business_id}")
-async def delete_business(business_id: str):
-    business = await db.businesses.find_one({"id": business_id}, {"_id": 0})
-    if not business:
-        raise HTTPException(status_code=404, detail="Business not found")
-    
-    await db.businesses.delete_one({"id": business_id})
-    return {"message": "Business deleted successfully"}
+def encode_dates(collection_name: str, doc: dict) -> dict:
+    """Convert a document's timestamp fields to UTC datetimes before it is written"""
+    for field in DATE_FIELDS[collection_name]:
+        if doc.get(field) is not None:
+            doc[field] = to_utc(doc[field])
+    return doc
 
-# Admin Business Settings Routes (for Settings page and invoice calculations)
-@api_router.get("/business", response_model=Optional[Business])
-async def get_admin_business():
-    """Get admin business settings (first business in collection)"""
-    business = await db.businesses.find_one({}, {"_id": 0})
-    if not business:
-        return None
-    
-    if isinstance(business['created_at'], str):
-        business['created_at'] = datetime.fromisoformat(business['created_at'])
-    if isinstance(business['updated_at'], str):
-        business['updated_at'] = datetime.fromisoformat(business['updated_at'])
-    
-    return Business(**business)
 
-@api_router.post("/business", response_model=Business)
-async def save_admin_business(input: BusinessCreate):
-    """Save or update admin business settings"""
-    # Check if admin business already exists
-    existing_business = await db.businesses.find_one({}, {"_id": 0})
-    
-    if existing_business:
-        # Update existing admin business
-        business_dict = input.model_dump()
-        business_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        business_dict['id'] = existing_business['id']
-        business_dict['created_at'] = existing_business['created_at']
-        
-        await db.businesses.update_one({"id": existing_business['id']}, {"$set": business_dict})
-        
-        if isinstance(business_dict['created_at'], str):
-            business_dict['created_at'] = datetime.fromisoformat(business_dict['created_at'])
-        if isinstance(business_dict['updated_at'], str):
-            business_dict['updated_at'] = datetime.fromisoformat(business_dict['updated_at'])
-        
-        return Business(**business_dict)
-    else:
-        # Create new admin business
-        business_obj = Business(**input.model_dump())
-        doc = business_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        
-        await db.businesses.insert_one(doc)
-        return business_obj
+def date_range_filter(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """Range condition on a date field; date-only bounds cover whole IST days"""
+    condition = {}
+    try:
+        if start_date:
+            condition["$gte"] = to_utc(start_date)
+        if end_date:
+            if len(end_date) == 10:
+                condition["$lt"] = to_utc(end_date) + timedelta(days=1)
+            else:
+                condition["$lte"] = to_utc(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO dates")
+    return condition
 
-@api_router.post("/business/upload-logo")
-async def upload_business_logo(file: UploadFile = File(...)):
-    """Upload business logo and store as base64"""
+
+async def migrate_string_dates(batch_size: int = 1000) -> int:
+    """Rewrite timestamps still stored as ISO strings as BSON dates; returns the documents changed.
+
+    Runs in _id order a batch at a time, and only rewrites a field that still holds the
+    string that was read, so it is safe to run while the app is serving writes.
+    """
+    migrated = 0
+    for collection_name, fields in DATE_FIELDS.items():
+        collection = db[collection_name]
+        stored_as_string = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        last_id = None
+        while True:
+            query = {"$and": [stored_as_string, {"_id": {"$gt": last_id}}]} if last_id else stored_as_string
+            docs = await collection.find(query, {field: 1 for field in fields}).sort("_id", ASCENDING).limit(batch_size).to_list(None)
+            if not docs:
+                break
+            last_id = docs[-1]['_id']
+
+            ops = []
+            for doc in docs:
+                strings = {field: doc[field] for field in fields if isinstance(doc.get(field), str)}
+                converted = {}
+                for field, value in strings.items():
+                    try:
+                        converted[field] = to_utc(value) if value else None
+                    except ValueError:
+                        logger.warning(f"Leaving unparseable {collection_name}.{field} of {doc['_id']}: {value!r}")
+                if converted:
+                    ops.append(UpdateOne({"_id": doc['_id'], **strings}, {"$set": converted}))
+            if ops:
+                result = await collection.bulk_write(ops, ordered=False)
+                migrated += result.modified_count
+    return migrated
+
+
+async def migrate_dates_in_background():
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Convert to base64
-        base64_encoded = base64.b64encode(contents).decode('utf-8')
-        logo_data = f"data:{file.content_type};base64,{base64_encoded}"
-        
-        # Update admin business with logo
-        existing_business = await db.businesses.find_one({}, {"_id": 0})
-        
-        if existing_business:
-            await db.businesses.update_one(
-                {"id": existing_business['id']}, 
-                {"$set": {"logo": logo_data, "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
-            return {"message": "Logo uploaded successfully", "logo": logo_data}
-        else:
-            raise HTTPException(status_code=404, detail="Business not found. Please save business details first.")
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload logo: {str(e)}")
+        migrated = await migrate_string_dates()
+    except Exception:
+        logger.exception("Migrating string timestamps to BSON dates failed")
+        return
+    if migrated:
+        logger.info(f"Migrated {migrated} documents from string timestamps to BSON dates")
 
 
-# Customer Routes
-@api_router.post("/customers", response_model=Customer)
-async def create_customer(input: CustomerCreate):
-    customer_data = input.model_dump(exclude={'business_data'})
-    
-    # Handle business logic
-    if input.has_business_with_gst:
-        if input.business_data and input.business_data.get('legal_name'):
-            business_data = input.business_data
-            
-            # Check if business with same GSTIN already exists
-            existing_business = None
-            if business_data.get('gstin'):
-                existing_business = await db.businesses.find_one(
-                    {"gstin": business_data['gstin']}, 
-                    {"_id": 0}
-                )
-            
-            if existing_business:
-                # Link to existing business
-                customer_data['business_id'] = existing_business['id']
-                customer_data['business_name'] = existing_business['legal_name']
-            else:
-                # Create new business
-                business_obj = Business(
-                    legal_name=business_data.get('legal_name'),
-                    nickname=business_data.get('nickname'),
-                    gstin=business_data.get('gstin'),
-                    state_code=business_data.get('state_code'),
-                    state=business_data.get('state'),
-                    city=business_data.get('city'),
-                    pan=business_data.get('pan'),
-                    others=business_data.get('others'),
-                    phone_1=business_data.get('phone_1'),
-                    phone_2=business_data.get('phone_2'),
-                    email_1=business_data.get('email_1'),
-                    email_2=business_data.get('email_2'),
-                    address_1=business_data.get('address_1'),
-                    address_2=business_data.get('address_2'),
-                )
-                business_doc = business_obj.model_dump()
-                business_doc['created_at'] = business_doc['created_at'].isoformat()
-                business_doc['updated_at'] = business_doc['updated_at'].isoformat()
-                await db.businesses.insert_one(business_doc)
-                
-                customer_data['business_id'] = business_obj.id
-                customer_data['business_name'] = business_obj.legal_name
-        else:
-            customer_data['business_name'] = "NA"
-    else:
-        customer_data['business_name'] = "NA"
-    
-    customer_obj = Customer(**customer_data)
-    doc = customer_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.customers.insert_one(doc)
-    return customer_obj
+# ============ SERIALIZATION ============
 
-@api_router.get("/customers", response_model=List[Customer])
-async def get_customers(search: Optional[str] = None, sort_by: Optional[str] = "created_at", sort_order: Optional[str] = "desc"):
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"nickname": {"$regex": search, "$options": "i"}},
-                {"phone_1": {"$regex": search, "$options": "i"}},
-                {"city_1": {"$regex": search, "$options": "i"}},
-                {"state_1": {"$regex": search, "$options": "i"}},
-                {"pincode_1": {"$regex": search, "$options": "i"}},
-            ]
-        }
-    
-    sort_direction = -1 if sort_order == "desc" else 1
-    customers = await db.customers.find(query, {"_id": 0}).sort(sort_by, sort_direction).to_list(1000)
-    
-    for customer in customers:
-        if isinstance(customer['created_at'], str):
-            customer['created_at'] = datetime.fromisoformat(customer['created_at'])
-        if isinstance(customer['updated_at'], str):
-            customer['updated_at'] = datetime.fromisoformat(customer['updated_at'])
-    
-    return customers
+# List routes serve documents read from our own collections, which were written through
+# the models. They skip response_model validation and are encoded with orjson; the
+# response_model on those routes only documents the schema.
+_model_defaults = {}
 
-@api_router.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str):
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    
-    if isinstance(customer['created_at'], str):
-        customer['created_at'] = datetime.fromisoformat(customer['created_at'])
-    if isinstance(customer['updated_at'], str):
-        customer['updated_at'] = datetime.fromisoformat(customer['updated_at'])
-    
-    return Customer(**customer)
 
-@api_router.put("/customers/{customer_id}", response_model=Customer)
-async def update_customer(customer_id: str, input: CustomerCreate):
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    
-    customer_dict = input.model_dump(exclude={'business_data'})
-    
-    # Handle business logic
-    if input.has_business_with_gst:
-        if input.business_data and input.business_data.get('legal_name'):
-            business_data = input.business_data
-            
-            # Check if business with same GSTIN already exists
-            existing_business = None
-            if business_data.get('gstin'):
-                existing_business = await db.businesses.find_one(
-                    {"gstin": business_data['gstin']}, 
-                    {"_id": 0}
-                )
-            
-            if existing_business:
-                # Link to existing business
-                customer_dict['business_id'] = existing_business['id']
-                customer_dict['business_name'] = existing_business['legal_name']
-            else:
-                # Create new business
-                business_obj = Business(
-                    legal_name=business_data.get('legal_name'),
-                    nickname=business_data.get('nickname'),
-                    gstin=business_data.get('gstin'),
-                    state_code=business_data.get('state_code'),
-                    state=business_data.get('state'),
-                    city=business_data.get('city'),
-                    pan=business_data.get('pan'),
-                    others=business_data.get('others'),
-                    phone_1=business_data.get('phone_1'),
-                    phone_2=business_data.get('phone_2'),
-                    email_1=business_data.get('email_1'),
-                    email_2=business_data.get('email_2'),
-                    address_1=business_data.get('address_1'),
-                    address_2=business_data.get('address_2'),
-                )
-                business_doc = business_obj.model_dump()
-                business_doc['created_at'] = business_doc['created_at'].isoformat()
-                business_doc['updated_at'] = business_doc['updated_at'].isoformat()
-                await db.businesses.insert_one(business_doc)
-                
-                customer_dict['business_id'] = business_obj.id
-                customer_dict['business_name'] = business_obj.legal_name
-        else:
-            customer_dict['business_name'] = "NA"
-            customer_dict['business_id'] = None
-    else:
-        customer_dict['business_name'] = "NA"
-        customer_dict['business_id'] = None
-    
-    customer_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-    customer_dict['id'] = customer['id']
-    customer_dict['created_at'] = customer['created_at']
-    
-    await db.customers.update_one({"id": customer_id}, {"$set": customer_dict})
-    
-    if isinstance(customer_dict['created_at'], str):
-        customer_dict['created_at'] = datetime.fromisoformat(customer_dict['created_at'])
-    if isinstance(customer_dict['updated_at'], str):
-        customer_dict['updated_at'] = datetime.fromisoformat(customer_dict['updated_at'])
-    
-    return Customer(**customer_dict)
+def sparse_fields(model, fields: Optional[str], extra=()) -> Optional[List[str]]:
+    """Field names selected by a ``fields=a,b,c`` parameter (plus "id"); None selects everything"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.model_fields and name not in extra]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", *names]))
 
-@api_router.delete("/customers/{customer_id}")
-async def delete_customer(customer_id: str):
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    
-    await db.customers.delete_one({"id": customer_id})
-    return {"message": "Customer deleted successfully"}
 
+def model_projection(model, fields: Optional[List[str]] = None, needed=()) -> dict:
+    """Projection selecting the given fields (default: all fields of the model), plus any
+    the route itself needs, e.g. for the cursor or search ranking"""
+    return {"_id": 0, **dict.fromkeys(fields if fields is not None else model.model_fields, 1), **dict.fromkeys(needed, 1)}
 
-# Product Routes
-@api_router.post("/products", response_model=Product)
-async def create_product(input: ProductCreate):
-    product_obj = Product(**input.model_dump())
-    doc = product_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.products.insert_one(doc)
-    return product_obj
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products(search: Optional[str] = None, sort_by: Optional[str] = "created_at", sort_order: Optional[str] = "desc"):
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"category": {"$regex": search, "$options": "i"}},
-                {"hsn": {"$regex": search, "$options": "i"}},
-            ]
+def model_defaults(model) -> dict:
+    """Plain (non-factory) defaults of a model, for documents written before a field existed"""
+    if model not in _model_defaults:
+        _model_defaults[model] = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
         }
-    
-    sort_direction = -1 if sort_order == "desc" else 1
-    products = await db.products.find(query, {"_id": 0}).sort(sort_by, sort_direction).to_list(1000)
-    
-    for product in products:
-        if isinstance(product['created_at'], str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-        if isinstance(product['updated_at'], str):
-            product['updated_at'] = datetime.fromisoformat(product['updated_at'])
-    
-    return products
+    return _model_defaults[model]
 
-@api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    if isinstance(product['created_at'], str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    if isinstance(product['updated_at'], str):
-        product['updated_at'] = datetime.fromisoformat(product['updated_at'])
-    
-    return Product(**product)
 
-@api_router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, input: ProductCreate):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    product_dict = input.model_dump()
-    product_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-    product_dict['id'] = product['id']
-    product_dict['created_at'] = product['created_at']
-    
-    await db.products.update_one({"id": product_id}, {"$set": product_dict})
-    
-    if isinstance(product_dict['created_at'], str):
-        product_dict['created_at'] = datetime.fromisoformat(product_dict['created_at'])
-    if isinstance(product_dict['updated_at'], str):
-        product_dict['updated_at'] = datetime.fromisoformat(product_dict['updated_at'])
-    
-    return Product(**product_dict)
+def trusted_response(docs: List[dict], model=None, response: Optional[Response] = None, fields: Optional[List[str]] = None) -> ORJSONResponse:
+    """Encode trusted documents as-is, trimmed to ``fields`` if given; headers set on the
+    route's ``response`` are carried over"""
+    defaults = model_defaults(model) if model is not None else {}
+    if fields is not None:
+        defaults = {field: value for field, value in defaults.items() if field in fields}
+        docs = [{field: doc[field] for field in fields if field in doc} for doc in docs]
+    if defaults:
+        docs = [{**defaults, **doc} for doc in docs]
+    return ORJSONResponse(docs, headers=dict(response.headers) if response else None)
 
-@api_router.delete("/products/{product_id}")
-async def delete_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    await db.products.delete_one({"id": product_id})
-    return {"message": "Product deleted successfully"}
 
+# ============ WRITES ============
 
-# Invoice Routes
-@api_router.post("/invoices", response_model=Invoice)
-async def create_invoice(input: InvoiceCreate):
-    # Generate invoice number
-    count = await db.invoices.count_documents({})
-    invoice_number = f"INV-{count + 1:05d}"
-    
-    invoice_obj = Invoice(**input.model_dump(), invoice_number=invoice_number)
-    doc = invoice_obj.model_dump()
-    doc['invoice_date'] = doc['invoice_date'].isoformat()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.invoices.insert_one(doc)
-    return invoice_obj
+# Mutating routes are a single find_one_and_update / find_one_and_delete. Every update
+# bumps "version"; a route given ?version=N only applies to that revision, so a client
+# editing a stale copy gets a 409 instead of silently overwriting someone else's change.
+DOCUMENT_PROJECTION = {"_id": 0, "search_tokens": 0}
 
-@api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices(
-    skip: int = 0, 
-    limit: int = 50, 
-    search: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    sort_by: Optional[str] = "created_at",
-    sort_order: Optional[str] = "desc",
-    include_deleted: bool = False
-):
-    query = {"is_deleted": False} if not include_deleted else {"is_deleted": True}
-    
-    if search:
-        query["$or"] = [
-            {"invoice_number": {"$regex": search, "$options": "i"}},
-            {"customer_name": {"$regex": search, "$options": "i"}},
-        ]
-    
-    # Date range filter
-    if start_date or end_date:
-        date_query = {}
-        if start_date:
-            date_query["$gte"] = start_date
-        if end_date:
-            date_query["$lte"] = end_date
-        if date_query:
-            query["invoice_date"] = date_query
-    
-    sort_direction = -1 if sort_order == "desc" else 1
-    invoices = await db.invoices.find(query, {"_id": 0}).sort(sort_by, sort_direction).skip(skip).limit(limit).to_list(limit)
-    
-    for invoice in invoices:
-        if isinstance(invoice.get('invoice_date'), str):
-            invoice['invoice_date'] = datetime.fromisoformat(invoice['invoice_date'])
-        if isinstance(invoice.get('created_at'), str):
-            invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-        if isinstance(invoice.get('updated_at'), str):
-            invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-        if invoice.get('deleted_at') and isinstance(invoice['deleted_at'], str):
-            invoice['deleted_at'] = datetime.fromisoformat(invoice['deleted_at'])
-    
-    return invoices
 
-@api_router.get("/invoices/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: str):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    if isinstance(invoice['invoice_date'], str):
-        invoice['invoice_date'] = datetime.fromisoformat(invoice['invoice_date'])
-    if isinstance(invoice['created_at'], str):
-        invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    if isinstance(invoice['updated_at'], str):
-        invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-    
-    return Invoice(**invoice)
+def version_filter(document_id: str, version: Optional[int]) -> dict:
+    query = {"id": document_id}
+    if version is not None:
+        # Documents written before versioning have no version field: they are revision 0
+        query["version"] = version if version else {"$in": [0, None]}
+    return query
 
-@api_router.put("/invoices/{invoice_id}/payment", response_model=Invoice)
-async def update_payment_status(invoice_id: str, payment_status: str, payment_method: Optional[str] = None):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    update_data = {
-        "payment_status": payment_status,
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    if payment_method:
-        update_data["payment_method"] = payment_method
-    
-    await db.invoices.update_one({"id": invoice_id}, {"$set": update_data})
-    
-    # Fetch updated invoice
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    
-    if isinstance(invoice['invoice_date'], str):
-        invoice['invoice_date'] = datetime.fromisoformat(invoice['invoice_date'])
-    if isinstance(invoice['created_at'], str):
-        invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    if isinstance(invoice['updated_at'], str):
-        invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-    
-    return Invoice(**invoice)
 
-@api_router.put("/invoices/{invoice_id}", response_model=Invoice)
-async def update_invoice(invoice_id: str, input: InvoiceCreate):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    invoice_dict = input.model_dump()
-    invoice_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-    invoice_dict['id'] = invoice['id']
-    invoice_dict['invoice_number'] = invoice['invoice_number']
-    invoice_dict['created_at'] = invoice['created_at']
-    invoice_dict['is_deleted'] = invoice.get('is_deleted', False)
-    invoice_dict['deleted_at'] = invoice.get('deleted_at')
-    
-    # Handle invoice_date - use provided or keep original
-    provided_date = invoice_dict.get('invoice_date')
-    if provided_date:
-        if isinstance(provided_date, datetime):
-            invoice_dict['invoice_date'] = provided_date.isoformat()
-        # invoice_date is already a string, keep it as is
-    else:
-        # Preserve original invoice_date if not provided
-        invoice_dict['invoice_date'] = invoice.get('invoice_date')
-    
-    await db.invoices.update_one({"id": invoice_id}, {"$set": invoice_dict})
-    
-    # Fetch and return updated invoice
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if isinstance(invoice['invoice_date'], str):
-        invoice['invoice_date'] = datetime.fromisoformat(invoice['invoice_date'])
-    if isinstance(invoice['created_at'], str):
-        invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    if isinstance(invoice['updated_at'], str):
-        invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-    
-    return Invoice(**invoice)
+async def raise_missing(collection_name: str, document_id: str, version: Optional[int], label: str):
+    """Raise 404, or 409 if the document exists but is no longer at the expected version"""
+    if version is not None and await db[collection_name].find_one({"id": document_id}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail=f"{label} was modified by someone else; reload it and try again")
+    raise HTTPException(status_code=404, detail=f"{label} not found")
 
-@api_router.delete("/invoices/{invoice_id}")
-async def soft_delete_invoice(invoice_id: str):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    await db.invoices.update_one(
-        {"id": invoice_id}, 
-        {"$set": {
-            "is_deleted": True,
-            "deleted_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    return {"message": "Invoice moved to archives"}
 
-@api_router.post("/invoices/{invoice_id}/restore")
-async def restore_invoice(invoice_id: str):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    await db.invoices.update_one(
-        {"id": invoice_id}, 
-        {"$set": {
-            "is_deleted": False,
-            "deleted_at": None,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    return {"message": "Invoice restored successfully"}
+# ============ CONDITIONAL REQUESTS ============
 
+# Entity GETs carry a strong ETag built from the document's id, updated_at and version
+# (updated_at only has millisecond resolution). A request with If-None-Match or
+# If-Modified-Since is first checked against a projection of just those fields, so an
+# unchanged entity costs a tiny read and no serialization. no-cache makes browsers
+# revalidate their copy on every use instead of guessing a freshness lifetime.
+VALIDATOR_PROJECTION = {"_id": 0, "id": 1, "created_at": 1, "updated_at": 1, "version": 1}
+ENTITY_CACHE_CONTROL = "private, no-cache"
+# Reference data served from constants in this module; it only changes with a deploy
+MASTER_DATA_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
 
-# Master Data Routes
-@api_router.get("/gst-rates")
-async def get_gst_rates():
-    return [
-        {"value": 0, "label": "0%"},
-        {"value": 5, "label": "5%"},
-        {"value": 12, "label": "12%"},
-        {"value": 18, "label": "18%"},
-        {"value": 28, "label": "28%"},
-    ]
 
-@api_router.get("/hsn-codes")
-async def get_hsn_codes(search: Optional[str] = None):
-    # Common HSN codes for sports clothing
-    hsn_codes = [
-        {"code": "6101", "description": "Men's or boys' overcoats, anoraks, windcheaters"},
-        {"code": "6102", "description": "Women's or girls' overcoats, anoraks, windcheaters"},
-        {"code": "6103", "description": "Men's or boys' suits, ensembles, jackets, trousers"},
-        {"code": "6104", "description": "Women's or girls' suits, ensembles, jackets, dresses, skirts"},
-        {"code": "6105", "description": "Men's or boys' shirts, knitted or crocheted"},
-        {"code": "6106", "description": "Women's or girls' blouses, shirts, knitted or crocheted"},
-        {"code": "6109", "description": "T-shirts, singlets and other vests, knitted or crocheted"},
-        {"code": "6110", "description": "Jerseys, pullovers, cardigans, waistcoats"},
-        {"code": "6111", "description": "Babies' garments and clothing accessories"},
-        {"code": "6112", "description": "Track suits, ski suits and swimwear, knitted"},
-        {"code": "6114", "description": "Other garments, knitted or crocheted"},
-        {"code": "6115", "description": "Panty hose, tights, stockings, socks"},
-        {"code": "6116", "description": "Gloves, mittens and mitts, knitted or crocheted"},
-        {"code": "6117", "description": "Other made up clothing accessories"},
+def entity_validators(doc: dict) -> dict:
+    """ETag, Last-Modified and Cache-Control headers of a stored document"""
+    modified = doc.get('updated_at') or doc.get('created_at')
+    if modified is None:
+        return {}
+    modified = to_utc(modified)
+    tag = hashlib.sha256(f"{doc['id']}|{modified.isoformat()}|{doc.get('version') or 0}".encode()).hexdigest()[:32]
+    return {"ETag": f'"{tag}"', "Last-Modified": format_datetime(modified, usegmt=True), "Cache-Control": ENTITY_CACHE_CONTROL}
+
+
+def is_not_modified(request: Request, validators: dict) -> bool:
+    """Whether the client's cached copy is current; If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "ETag" in validators and (validators["ETag"] in tags or "*" in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or "Last-Modified" not in validators:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if not since.tzinfo:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(validators["Last-Modified"]) <= since
+
+
+async def read_entity(request: Request, response: Response, collection_name: str, entity_id: str, label: str):
+    """The document for an entity GET, with its validators set on ``response``; or a 304
+    Response to return as-is when the client's copy is current"""
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        current = await db[collection_name].find_one({"id": entity_id}, VALIDATOR_PROJECTION)
+        if not current:
+            raise HTTPException(status_code=404, detail=f"{label} not found")
+        validators = entity_validators(current)
+        if is_not_modified(request, validators):
+            return Response(status_code=304, headers=validators)
+
+    doc = await db[collection_name].find_one({"id": entity_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    response.headers.update(entity_validators(doc))
+    return doc
+
+
+class PrecomputedJSON:
+    """A constant JSON body, encoded once at startup, served with an ETag of its content"""
+
+    def __init__(self, content):
+        self.body = JSONResponse(content).body
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": MASTER_DATA_CACHE_CONTROL}
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+# ============ PAGINATION ============
+
+# Sort fields each list endpoint accepts. Every one is backed by a (field, id) index, so a
+# page is an index range scan no matter how deep it is and never needs an in-memory sort.
+SORT_FIELDS = {
+    "businesses": ["created_at", "legal_name"],
+    "customers": ["created_at", "name"],
+    "products": ["created_at", "name", "category", "hsn", "gst_rate"],
+    "invoices": ["created_at", "invoice_date", "invoice_number", "customer_name", "grand_total"],
+}
+
+MAX_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Order within a relevance tier of a ranked search (see SEARCH_TIER_MARKS), newest first;
+# the search_tokens indexes end in these fields
+SEARCH_TIER_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+
+def pack_cursor(sort_by: str, sort_order, value, last_id: str) -> str:
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps([sort_by, sort_order, value, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def unpack_cursor(cursor: str) -> tuple:
+    """(sort_by, sort_order, value, last_id) of a cursor; 400 if it is not one of ours"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_by, sort_order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if isinstance(value, dict):
+        try:
+            value = datetime.fromisoformat(value["$date"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_by, sort_order, value, last_id
+
+
+def encode_cursor(sort_by: str, sort_order: str, doc: dict) -> str:
+    """Opaque token pointing just past ``doc`` in the (sort_by, id) order"""
+    return pack_cursor(sort_by, sort_order, doc.get(sort_by), doc['id'])
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str):
+    cursor_sort_by, cursor_sort_order, value, last_id = unpack_cursor(cursor)
+    if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_order")
+    return value, last_id
+
+
+def keyset_after(sort_by: str, direction: int, value, last_id: str) -> dict:
+    """Filter for the documents after (value, last_id) in the (sort_by, id) order"""
+    op = "$lt" if direction < 0 else "$gt"
+    after = [{sort_by: value, "id": {op: last_id}}]
+    # Nulls sort before every other value
+    if value is None:
+        if direction > 0:
+            after.append({sort_by: {"$ne": None}})
+    else:
+        after.append({sort_by: {op: value}})
+        if direction < 0:
+            after.append({sort_by: None})
+    return {"$or": after}
+
+
+def keyset_query(collection_name: str, query: dict, sort_by: Optional[str], sort_order: Optional[str], cursor: Optional[str]):
+    """Validate the sort and return (query, sort) for the page that starts after ``cursor``"""
+    sort_by = sort_by or "created_at"
+    if sort_by not in SORT_FIELDS[collection_name]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported sort_by '{sort_by}'. Allowed: {', '.join(SORT_FIELDS[collection_name])}",
+        )
+    if sort_order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="sort_order must be 'asc' or 'desc'")
+
+    direction = -1 if sort_order == "desc" else 1
+    sort = [(sort_by, direction), ("id", direction)]
+    if not cursor:
+        return query, sort
+
+    value, last_id = decode_cursor(cursor, sort_by, sort_order)
+    after = keyset_after(sort_by, direction, value, last_id)
+    return {"$and": [query, after]} if query else after, sort
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """List bodies stay plain arrays; the cursor for the following page travels in a header"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def list_read_fields(ranked: bool, sort_by: Optional[str]) -> List[str]:
+    """Fields a list route reads besides the requested ones: the cursor's sort field"""
+    if ranked:
+        return [field for field, _ in SEARCH_TIER_SORT]
+    return [sort_by or "created_at"]
+
+
+def take_page(docs: List[dict], limit: int, sort_by: Optional[str], sort_order: Optional[str]):
+    """Trim a limit + 1 fetch to the page and return (docs, next_cursor)"""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(sort_by or "created_at", sort_order, docs[-1])
+
+
+# ============ INDEXES ============
+
+# Only documents that are not archived are ever read by the hot invoice queries
+ACTIVE_INVOICES = {"is_deleted": False}
+
+
+def sort_indexes(collection_name: str, *prefix) -> List[IndexModel]:
+    """Keyset pagination indexes for every allowed sort field of a collection"""
+    return [
+        IndexModel([*prefix, (field, ASCENDING), ("id", ASCENDING)], name=f"sort_{field}")
+        for field in SORT_FIELDS[collection_name]
+    ]
+
+
+# Declarative index registry, applied at startup by ensure_indexes()
+INDEXES = {
+    "businesses": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Partial rather than sparse: businesses without a GSTIN are stored with gstin=None,
+        # which a sparse index would still index (and reject as duplicates)
+        IndexModel(
+            [("gstin", ASCENDING)], name="gstin_unique", unique=True,
+            partialFilterExpression={"gstin": {"$gt": ""}},
+        ),
+        *sort_indexes("businesses"),
+        IndexModel([("search_tokens", ASCENDING), *SEARCH_TIER_SORT], name="search_tokens"),
+    ],
+    "customers": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("business_id", ASCENDING)], name="business_id"),
+        *sort_indexes("customers"),
+        IndexModel([("search_tokens", ASCENDING), *SEARCH_TIER_SORT], name="search_tokens"),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        *sort_indexes("products"),
+        IndexModel([("search_tokens", ASCENDING), *SEARCH_TIER_SORT], name="search_tokens"),
+    ],
+    "invoices": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("invoice_number", ASCENDING)], name="invoice_number_unique", unique=True),
+        # Invoice list and archives: filter on is_deleted, then the requested sort
+        *sort_indexes("invoices", ("is_deleted", ASCENDING)),
+        # Date-range filters on the invoice list and dashboard
+        IndexModel(
+            [("invoice_date", DESCENDING)], name="active_by_invoice_date",
+            partialFilterExpression=ACTIVE_INVOICES,
+        ),
+        # Pending dues on the dashboard
+        IndexModel(
+            [("payment_status", ASCENDING), ("invoice_date", DESCENDING)], name="active_by_payment_status",
+            partialFilterExpression=ACTIVE_INVOICES,
+        ),
+        # Largest dues on the dashboard: unpaid invoices owe the grand total, partial ones the balance
+        IndexModel(
+            [("payment_status", ASCENDING), ("grand_total", DESCENDING), ("id", ASCENDING)],
+            name="active_by_status_grand_total", partialFilterExpression=ACTIVE_INVOICES,
+        ),
+        IndexModel(
+            [("payment_status", ASCENDING), ("balance_due", DESCENDING), ("id", ASCENDING)],
+            name="active_by_status_balance_due", partialFilterExpression=ACTIVE_INVOICES,
+        ),
+        # Open invoices of a customer statement, oldest first
+        IndexModel(
+            [("customer_id", ASCENDING), ("invoice_date", ASCENDING)], name="active_by_customer",
+            partialFilterExpression=ACTIVE_INVOICES,
+        ),
+        IndexModel([("is_deleted", ASCENDING), ("search_tokens", ASCENDING), *SEARCH_TIER_SORT], name="search_tokens"),
+    ],
+    "daily_sales": [
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    "customer_balances": [
+        # Top debtors and the aging report
+        IndexModel([("outstanding", DESCENDING)], name="outstanding"),
+    ],
+}
+
+# Index options that change the meaning of an index; anything else (v, ns, ...) is ignored
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _plain(value):
+    """Option value with SON / nested mappings turned into plain dicts, so decoded and declared specs compare equal"""
+    if isinstance(value, Mapping):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _index_signature(spec: dict) -> tuple:
+    """Comparable (key, options) view of an index spec from IndexModel or index_information()"""
+    key = tuple((field, direction) for field, direction in dict(spec['key']).items())
+    options = tuple((option, _plain(spec[option])) for option in INDEX_OPTIONS if spec.get(option))
+    return key, options
+
+
+async def ensure_indexes():
+    """Create missing registry indexes and rebuild any whose definition has changed"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        for model in models:
+            spec = model.document
+            current = existing.get(spec['name'])
+            if current and _index_signature(current) == _index_signature(spec):
+                continue
+
+            try:
+                if current:
+                    logger.info(f"Rebuilding index {collection_name}.{spec['name']}")
+                    await collection.drop_index(spec['name'])
+                else:
+                    logger.info(f"Creating index {collection_name}.{spec['name']}")
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                # e.g. duplicate GSTINs already in the data; keep serving and surface it in /api/admin/indexes
+                logger.error(f"Failed to build index {collection_name}.{spec['name']}: {e}")
+
+
+async def get_index_report():
+    """Compare the registry with the indexes that exist, and how often each one is used"""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        try:
+            stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+            usage = {s['name']: s['accesses']['ops'] for s in stats}
+        except OperationFailure:
+            usage = {}
+
+        expected = {model.document['name']: model.document for model in models}
+        missing = [
+            name for name, spec in expected.items()
+            if name not in existing or _index_signature(existing[name]) != _index_signature(spec)
+        ]
+        report[collection_name] = {
+            "missing": missing,
+            "unused": [name for name in existing if name != "_id_" and usage.get(name) == 0],
+            "unmanaged": [name for name in existing if name != "_id_" and name not in expected],
+            "usage": usage,
+        }
+    return report
+
+
+# ============ SEARCH ============
+
+# Every searchable document carries a "search_tokens" array (multikey-indexed) holding the
+# lower-cased word prefixes of these fields. The first field of each list is the primary one
+# for ranking: its whole words and word prefixes are also stored marked (see SEARCH_TIER_MARKS).
+SEARCH_FIELDS = {
+    "businesses": ["legal_name", "nickname", "city", "state", "gstin"],
+    "customers": ["name", "nickname", "phone_1", "city_1", "state_1", "pincode_1"],
+    "products": ["name", "category", "hsn"],
+    "invoices": ["invoice_number", "customer_name"],
+}
+
+# Identifier-like fields also match from the middle, e.g. the last digits of a phone number
+SEARCH_INFIX_FIELDS = {"gstin", "phone_1", "pincode_1", "hsn", "invoice_number"}
+
+MAX_SEARCH_TOKEN_LENGTH = 20
+
+# Relevance tiers of a ranked search, best first: every term is a whole word of the primary
+# field ("==word"), a whole word of any field ("=word"), a word prefix of the primary field
+# ("^prefix"), or just a match (the plain tokens). Each tier is one index-backed query.
+SEARCH_TIER_MARKS = ["==", "=", "^", ""]
+
+
+def search_words(value) -> List[str]:
+    """Lower-case, accent-free alphanumeric words of a field value or search string"""
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii").lower()
+    return [word[:MAX_SEARCH_TOKEN_LENGTH] for word in re.split(r"[^a-z0-9]+", text) if word]
+
+
+def build_search_tokens(collection_name: str, doc: dict) -> List[str]:
+    tokens = set()
+    for position, field in enumerate(SEARCH_FIELDS[collection_name]):
+        if not doc.get(field):
+            continue
+        for word in search_words(doc[field]):
+            prefixes = [word[:end] for end in range(1, len(word) + 1)]
+            tokens.update(prefixes)
+            tokens.add(f"={word}")
+            if position == 0:
+                tokens.add(f"=={word}")
+                tokens.update(f"^{prefix}" for prefix in prefixes)
+            if field in SEARCH_INFIX_FIELDS:
+                tokens.update(
+                    word[start:end]
+                    for start in range(1, len(word) - 1)
+                    for end in range(start + 2, len(word) + 1)
+                )
+    return sorted(tokens)
+
+
+def with_search_tokens(collection_name: str, doc: dict) -> dict:
+    doc['search_tokens'] = build_search_tokens(collection_name, doc)
+    return doc
+
+
+def search_filter(search: Optional[str]) -> dict:
+    """Index-backed filter matching documents that contain every search term as a word prefix"""
+    if not search or not search.strip():
+        return {}
+    terms = search_words(search)
+    if not terms:
+        # Nothing searchable (e.g. only punctuation) matches nothing
+        return {"search_tokens": {"$in": []}}
+    if len(terms) == 1:
+        return {"search_tokens": terms[0]}
+    return {"search_tokens": {"$all": terms}}
+
+
+def search_tier_filters(search: str) -> List[dict]:
+    """One filter per relevance tier; each leaves out the documents of the tiers before it"""
+    terms = search_words(search)
+    if not terms:
+        return []
+    tiers = [{"search_tokens": {"$all": [mark + term for term in terms]}} for mark in SEARCH_TIER_MARKS]
+    return [{**tier, "$nor": tiers[:position]} if position else tier for position, tier in enumerate(tiers)]
+
+
+def encode_search_cursor(tier: int, doc: dict) -> str:
+    """Cursor just past ``doc`` of ``tier`` in the ranked order"""
+    sort_by = SEARCH_TIER_SORT[0][0]
+    return pack_cursor("relevance", tier, doc.get(sort_by), doc['id'])
+
+
+def decode_search_cursor(cursor: str):
+    sort_by, tier, value, last_id = unpack_cursor(cursor)
+    if sort_by != "relevance" or tier not in range(len(SEARCH_TIER_MARKS)):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_order")
+    return tier, value, last_id
+
+
+async def ranked_search(find, query: dict, search: str, limit: int, cursor: Optional[str] = None):
+    """A page of the matches of ``query`` for ``search``, by tier, then newest first; returns
+    (docs, next_cursor).
+
+    ``find(query, sort, limit)`` runs one query and returns its documents. Tiers are read in
+    order until the page is full, each from the search_tokens index in SEARCH_TIER_SORT
+    order, so nothing is ranked in memory and the cost does not grow with the match count.
+    """
+    first_tier, after = 0, None
+    if cursor:
+        first_tier, value, last_id = decode_search_cursor(cursor)
+        after = keyset_after(SEARCH_TIER_SORT[0][0], SEARCH_TIER_SORT[0][1], value, last_id)
+
+    # (tier, doc), one more than the page to tell whether another page follows
+    found = []
+    for tier, tier_filter in enumerate(search_tier_filters(search)):
+        if tier < first_tier:
+            continue
+        if len(found) > limit:
+            break
+        match = {**query, **tier_filter}
+        if tier == first_tier and after:
+            match = {"$and": [match, after]}
+        found += [(tier, doc) for doc in await find(match, SEARCH_TIER_SORT, limit + 1 - len(found))]
+
+    docs = [doc for _, doc in found[:limit]]
+    if len(found) <= limit:
+        return docs, None
+    return docs, encode_search_cursor(found[limit - 1][0], docs[-1])
+
+
+async def backfill_search_tokens(batch_size: int = 1000):
+    """Add search tokens to documents written before search tokens (or their current form) existed"""
+    for collection_name, fields in SEARCH_FIELDS.items():
+        collection = db[collection_name]
+        projection = {"_id": 1, **{field: 1 for field in fields}}
+        batch = []
+        # Missing, or written before whole words were stored marked
+        async for doc in collection.find({"search_tokens": {"$not": {"$regex": "^="}}}, projection):
+            batch.append(UpdateOne({"_id": doc['_id']}, {"$set": {"search_tokens": build_search_tokens(collection_name, doc)}}))
+            if len(batch) >= batch_size:
+                await collection.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await collection.bulk_write(batch, ordered=False)
+
+
+# ============ LOGO STORAGE ============
+
+# Logos are stored once in GridFS, keyed by the SHA-256 of their content. Business
+# documents only hold the API path of the logo, e.g. "/logos/<sha256>".
+LOGO_URL_PREFIX = "/logos/"
+LOGO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def logo_bucket():
+    return AsyncIOMotorGridFSBucket(db, bucket_name="logos")
+
+
+async def store_logo(contents: bytes, content_type: Optional[str]) -> str:
+    """Store logo bytes (deduplicated by hash) and return the reference to keep on the business"""
+    digest = hashlib.sha256(contents).hexdigest()
+    if not await db["logos.files"].find_one({"filename": digest}, {"_id": 1}):
+        await logo_bucket().upload_from_stream(
+            digest, contents, metadata={"content_type": content_type or "application/octet-stream"}
+        )
+    return f"{LOGO_URL_PREFIX}{digest}"
+
+
+async def externalize_logo(logo: Optional[str]) -> Optional[str]:
+    """Move an inline base64 data: URL into the logo store; references pass through unchanged"""
+    if not logo or not logo.startswith("data:"):
+        return logo
+
+    header, _, encoded = logo.partition(",")
+    content_type = header[len("data:"):].split(";")[0]
+    return await store_logo(base64.b64decode(encoded), content_type)
+
+
+async def migrate_inline_logos():
+    """One-off migration of logos saved as data: URLs on the business document"""
+    async for business in db.businesses.find({"logo": {"$regex": "^data:"}}, {"_id": 0, "id": 1, "logo": 1}):
+        logo_ref = await externalize_logo(business['logo'])
+        await db.businesses.update_one({"id": business['id']}, {"$set": {"logo": logo_ref}, "$inc": {"version": 1}})
+        logger.info(f"Moved inline logo of business {business['id']} to {logo_ref}")
+    admin_business_cache.invalidate()
+
+
+# ============ INVOICE NUMBERING ============
+
+INVOICE_NUMBER_PREFIX = os.environ.get('INVOICE_NUMBER_PREFIX', 'INV')
+# By default numbers continue the original INV-00001 series. Setting this to true opts
+# in to restarting numbering every financial year (April-March), e.g. INV/2025-26/00001.
+INVOICE_NUMBER_PER_FINANCIAL_YEAR = os.environ.get('INVOICE_NUMBER_PER_FINANCIAL_YEAR', 'false').lower() == 'true'
+# Numbers each worker reserves per counter update. 1 keeps the series gapless and in
+# creation order; larger blocks remove counter contention at the cost of both.
+INVOICE_NUMBER_BLOCK_SIZE = int(os.environ.get('INVOICE_NUMBER_BLOCK_SIZE', '1'))
+
+
+def financial_year(when: datetime) -> str:
+    """Indian financial year label of a date, e.g. 2025-26 for 2025-04-01 .. 2026-03-31"""
+    if when.tzinfo:
+        when = when.astimezone(IST)
+    start = when.year if when.month >= 4 else when.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def invoice_series(when: datetime) -> str:
+    """Invoice number prefix (everything before the sequence) for an invoice dated ``when``"""
+    if INVOICE_NUMBER_PER_FINANCIAL_YEAR:
+        return f"{INVOICE_NUMBER_PREFIX}/{financial_year(when)}/"
+    return f"{INVOICE_NUMBER_PREFIX}-"
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from per-series counters in the counters collection"""
+
+    def __init__(self, block_size: int):
+        self.block_size = max(block_size, 1)
+        self._blocks = {}
+        self._lock = asyncio.Lock()
+
+    async def _reserve(self, series: str, count: int) -> int:
+        """Atomically advance the series counter by ``count`` and return its new value"""
+        counter = await db.counters.find_one_and_update(
+            {"_id": f"invoice:{series}"},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter['seq']
+
+    async def next_number(self, when: datetime) -> str:
+        series = invoice_series(when)
+        if self.block_size == 1:
+            seq = await self._reserve(series, 1)
+        else:
+            async with self._lock:
+                next_seq, last_seq = self._blocks.get(series, (1, 0))
+                if next_seq > last_seq:
+                    last_seq = await self._reserve(series, self.block_size)
+                    next_seq = last_seq - self.block_size + 1
+                seq = next_seq
+                self._blocks[series] = (next_seq + 1, last_seq)
+        return f"{series}{seq:05d}"
+
+
+invoice_numbers = InvoiceNumberAllocator(block_size=INVOICE_NUMBER_BLOCK_SIZE)
+
+
+async def seed_invoice_counter():
+    """Start the current series after the highest number already issued in it.
+
+    Only runs while the counter does not exist yet, e.g. on first start after upgrading
+    from count-based numbering.
+    """
+    series = invoice_series(datetime.now(timezone.utc))
+    if await db.counters.find_one({"_id": f"invoice:{series}"}, {"_id": 1}):
+        return
+
+    pattern = re.compile(rf"^{re.escape(series)}(\d+)$")
+    highest = 0
+    async for invoice in db.invoices.find({"invoice_number": {"$regex": f"^{re.escape(series)}"}}, {"_id": 0, "invoice_number": 1}):
+        match = pattern.match(invoice['invoice_number'])
+        if match:
+            highest = max(highest, int(match.group(1)))
+
+    # $max keeps this safe against a worker that already started allocating
+    await db.counters.update_one({"_id": f"invoice:{series}"}, {"$max": {"seq": highest}}, upsert=True)
+
+
+# ============ SALES ROLLUPS ============
+
+# daily_sales holds one document per (IST business day, payment status) with the running
+# totals of the active invoices in it. Amounts are kept in integer paise so that the
+# +/- deltas applied by every invoice write never accumulate float error.
+ROLLUP_AMOUNT_FIELDS = ("sales", "collected", "outstanding")
+
+
+def to_paise(amount) -> int:
+    return int(round((amount or 0) * 100))
+
+
+def business_day(value) -> str:
+    """IST calendar day of an invoice date; dates without an offset are already local"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo:
+        value = value.astimezone(IST)
+    return value.date().isoformat()
+
+
+def invoice_outstanding(invoice: dict) -> int:
+    """Amount still owed on an invoice in paise, with the same notion of "due" as the
+    dashboard: unpaid owes everything, partial its balance"""
+    status = invoice.get('payment_status') or "unpaid"
+    if status == "unpaid":
+        return to_paise(invoice.get('grand_total'))
+    if status == "partial":
+        return to_paise(invoice.get('balance_due'))
+    return 0
+
+
+def rollup_contribution(invoice: Optional[dict]):
+    """(rollup key, increments) an invoice adds to daily_sales, or None if it adds nothing"""
+    if not invoice or invoice.get('is_deleted') or not invoice.get('invoice_date'):
+        return None
+
+    status = invoice.get('payment_status') or "unpaid"
+    sales = to_paise(invoice.get('grand_total'))
+    outstanding = invoice_outstanding(invoice)
+
+    day = business_day(invoice['invoice_date'])
+    increments = {"invoice_count": 1, "sales": sales, "collected": sales - outstanding, "outstanding": outstanding}
+    return (day, status), increments
+
+
+async def apply_rollup_deltas(changes: List[tuple]):
+    """Move each invoice's contribution from its old state to its new one.
+
+    changes is a list of (before, after) pairs; increments to the same bucket are
+    summed so a batch of writes costs one $inc per bucket it touches.
+    """
+    totals = {}
+    for before, after in changes:
+        for invoice, sign in ((before, -1), (after, 1)):
+            contribution = rollup_contribution(invoice)
+            if not contribution:
+                continue
+            key, increments = contribution
+            bucket = totals.setdefault(key, dict.fromkeys(increments, 0))
+            for field, value in increments.items():
+                bucket[field] += sign * value
+    ops = [
+        UpdateOne(
+            {"_id": f"{day}|{status}"},
+            {"$inc": increments, "$setOnInsert": {"day": day, "payment_status": status}},
+            upsert=True,
+        )
+        for (day, status), increments in totals.items()
+    ]
+    if ops:
+        await db.daily_sales.bulk_write(ops, ordered=False)
+
+
+async def rebuild_daily_sales() -> int:
+    """Recompute daily_sales from the invoices and swap it in; returns the bucket count.
+
+    Invoice writes that land while the rebuild runs are not reflected, so run it when
+    the app is quiet (or simply run it again).
+    """
+    totals = {}
+    async for invoice in db.invoices.find({"is_deleted": False}, {
+        "_id": 0, "invoice_date": 1, "payment_status": 1, "grand_total": 1, "balance_due": 1, "is_deleted": 1,
+    }):
+        contribution = rollup_contribution(invoice)
+        if not contribution:
+            continue
+        key, increments = contribution
+        bucket = totals.setdefault(key, dict.fromkeys(increments, 0))
+        for field, value in increments.items():
+            bucket[field] += value
+
+    docs = [
+        {"_id": f"{day}|{status}", "day": day, "payment_status": status, **bucket}
+        for (day, status), bucket in totals.items()
+    ]
+    await replace_collection("daily_sales", docs)
+    return len(docs)
+
+
+async def replace_collection(collection_name: str, docs: List[dict]):
+    """Swap in freshly computed documents for a derived collection, then restore its indexes"""
+    # Staged under a name of its own, so concurrent rebuilds (e.g. several workers starting
+    # at once) never write into each other's staging collection
+    staging = db[f"{collection_name}_rebuild_{uuid.uuid4().hex}"]
+    try:
+        if docs:
+            await staging.insert_many(docs)
+            await staging.rename(collection_name, dropTarget=True)
+        else:
+            await db[collection_name].delete_many({})
+    finally:
+        # Only left behind if the swap failed
+        await staging.drop()
+    await db[collection_name].create_indexes(INDEXES[collection_name])
+
+
+async def backfill_daily_sales():
+    """Build the rollups on first start after they were introduced"""
+    if await db.daily_sales.find_one({}, {"_id": 1}):
+        return
+    if await db.invoices.find_one({"is_deleted": False}, {"_id": 1}):
+        logger.info(f"Backfilled {await rebuild_daily_sales()} daily sales rollups")
+
+
+# ============ CUSTOMER BALANCES ============
+
+# customer_balances holds one document per customer (_id = customer id) with what the
+# customer still owes, in paise: the total, the number of open invoices and the amount
+# per invoice day ("open_by_day"), from which the aging buckets are derived at read time.
+# Like daily_sales it is maintained with +/- deltas by every invoice write; days that
+# were paid off stay behind at zero until the next rebuild.
+AGING_BUCKETS = (("0-30", 0, 30), ("31-60", 31, 60), ("61-90", 61, 90), ("90+", 91, None))
+
+
+def balance_contribution(invoice: Optional[dict]):
+    """(customer id, IST day, paise) an invoice adds to its customer's balance, or None"""
+    if not invoice or invoice.get('is_deleted') or not invoice.get('customer_id') or not invoice.get('invoice_date'):
+        return None
+    outstanding = invoice_outstanding(invoice)
+    if not outstanding:
+        return None
+    return invoice['customer_id'], business_day(invoice['invoice_date']), outstanding
+
+
+async def apply_balance_deltas(changes: List[tuple]):
+    """Move each invoice's unpaid amount from its old state to its new one, one update per customer"""
+    totals = {}
+    for before, after in changes:
+        for invoice, sign in ((before, -1), (after, 1)):
+            contribution = balance_contribution(invoice)
+            if not contribution:
+                continue
+            customer_id, day, outstanding = contribution
+            balance = totals.setdefault(customer_id, {"$inc": {"outstanding": 0, "open_invoices": 0}})
+            balance["$inc"]["outstanding"] += sign * outstanding
+            balance["$inc"]["open_invoices"] += sign
+            day_field = f"open_by_day.{day}"
+            balance["$inc"][day_field] = balance["$inc"].get(day_field, 0) + sign * outstanding
+            if sign > 0:
+                balance["$set"] = {"customer_name": invoice.get('customer_name')}
+    ops = [UpdateOne({"_id": customer_id}, update, upsert=True) for customer_id, update in totals.items()]
+    if ops:
+        await db.customer_balances.bulk_write(ops, ordered=False)
+
+
+async def record_invoice_changes(changes: List[tuple]):
+    """Update every invoice-derived aggregate for a batch of (before, after) invoice writes"""
+    await asyncio.gather(apply_rollup_deltas(changes), apply_balance_deltas(changes), invalidate_gst_summaries(changes))
+
+
+async def record_invoice_change(before: Optional[dict], after: Optional[dict]):
+    """Update every invoice-derived aggregate for one invoice write"""
+    await record_invoice_changes([(before, after)])
+
+
+def aging_buckets(open_by_day: dict, today: date) -> dict:
+    """Split a customer's per-day open amounts (paise) into aging buckets (rupees)"""
+    buckets = dict.fromkeys((name for name, _, _ in AGING_BUCKETS), 0)
+    for day, amount in (open_by_day or {}).items():
+        if not amount:
+            continue
+        age = max((today - date.fromisoformat(day)).days, 0)
+        for name, low, high in AGING_BUCKETS:
+            if age >= low and (high is None or age <= high):
+                buckets[name] += amount
+                break
+    return {name: amount / 100 for name, amount in buckets.items()}
+
+
+def balance_summary(balance: dict, today: date) -> dict:
+    return {
+        "customer_id": balance['_id'],
+        "customer_name": balance.get('customer_name'),
+        "outstanding": balance.get('outstanding', 0) / 100,
+        "open_invoices": balance.get('open_invoices', 0),
+        "aging": aging_buckets(balance.get('open_by_day'), today),
+    }
+
+
+async def rebuild_customer_balances() -> int:
+    """Recompute customer_balances from the invoices and swap it in; returns the customer count.
+
+    Same caveat as rebuild_daily_sales: writes that land while it runs are not reflected.
+    """
+    balances = {}
+    async for invoice in db.invoices.find(
+        {"is_deleted": False, "payment_status": {"$in": ["unpaid", "partial"]}},
+        {"_id": 0, "customer_id": 1, "customer_name": 1, "invoice_date": 1, "payment_status": 1,
+         "grand_total": 1, "balance_due": 1, "is_deleted": 1},
+    ):
+        contribution = balance_contribution(invoice)
+        if not contribution:
+            continue
+        customer_id, day, outstanding = contribution
+        balance = balances.setdefault(customer_id, {
+            "_id": customer_id, "customer_name": invoice.get('customer_name'),
+            "outstanding": 0, "open_invoices": 0, "open_by_day": {},
+        })
+        balance['outstanding'] += outstanding
+        balance['open_invoices'] += 1
+        balance['open_by_day'][day] = balance['open_by_day'].get(day, 0) + outstanding
+
+    await replace_collection("customer_balances", list(balances.values()))
+    return len(balances)
+
+
+async def backfill_customer_balances():
+    """Build the balance ledger on first start after it was introduced"""
+    if await db.customer_balances.find_one({}, {"_id": 1}):
+        return
+    if await db.invoices.find_one({"is_deleted": False, "payment_status": {"$in": ["unpaid", "partial"]}}, {"_id": 1}):
+        logger.info(f"Backfilled {await rebuild_customer_balances()} customer balances")
+
+
+# ============ CACHES ============
+
+class AdminBusinessCache:
+    """Process-local cache of the admin business settings document (first business).
+
+    Writes made through this process invalidate it immediately; the TTL bounds how
+    long another worker can keep serving a copy that was changed elsewhere.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._document = None
+        self._loaded_at = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def get(self) -> Optional[dict]:
+        if not self._is_fresh():
+            # Only one coroutine reloads; the others wait and then hit the fresh copy
+            async with self._lock:
+                if not self._is_fresh():
+                    self.misses += 1
+                    generation = self._generation
+                    document = await db.businesses.find_one({}, {"_id": 0, "search_tokens": 0})
+                    # Don't cache a read that raced with an invalidation
+                    if generation == self._generation:
+                        self._document = document
+                        self._loaded_at = time.monotonic()
+                    return dict(document) if document else None
+
+        self.hits += 1
+        return dict(self._document) if self._document else None
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+        self._document = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "cached": self._is_fresh(),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+admin_business_cache = AdminBusinessCache(ttl_seconds=float(os.environ.get('ADMIN_BUSINESS_CACHE_TTL', '60')))
+
+
+# ============ GST ============
+
+# Line and invoice amounts are computed by the tax engine in gst.py from quantity, rate,
+# discount and GST rate; the client's figures are only a preview. The supply is
+# inter-state (IGST) when the admin business and the customer GSTIN are in different states.
+GST_AUDIT_BATCH_SIZE = int(os.environ.get('GST_AUDIT_BATCH_SIZE', '5000'))
+
+GST_AUDIT_PROJECTION = {
+    "_id": 0, "id": 1, "invoice_number": 1, "customer_gstin": 1, "items": 1,
+    **dict.fromkeys(gst.TOTAL_FIELDS, 1),
+}
+
+
+async def price_invoice(invoice: dict) -> dict:
+    """Recompute the tax and totals of an invoice about to be written, and what is due on it"""
+    gst.price_invoice(invoice, await admin_business_cache.get())
+    status = invoice.get('payment_status')
+    if status == "partial":
+        invoice['balance_due'] = max(0, round(invoice['grand_total'] - (invoice.get('paid_amount') or 0), 2))
+    elif status == "fully_paid":
+        invoice['paid_amount'] = invoice['grand_total']
+    return invoice
+
+
+async def audit_gst(batch_size: int = GST_AUDIT_BATCH_SIZE):
+    """Stream every stored invoice through the tax engine in batches.
+
+    Yields a report for each invoice whose stored amounts disagree with the engine,
+    then a summary.
+    """
+    business = await admin_business_cache.get()
+    started = time.perf_counter()
+    counts = {"invoices": 0, "line_items": 0, "mismatched_invoices": 0}
+    batch = []
+
+    async def audit_batch():
+        counts["invoices"] += len(batch)
+        counts["line_items"] += sum(len(invoice.get('items') or []) for invoice in batch)
+        reports = await asyncio.to_thread(gst.audit_invoices, batch, business)
+        counts["mismatched_invoices"] += len(reports)
+        return reports
+
+    async for invoice in db.invoices.find({}, GST_AUDIT_PROJECTION).batch_size(batch_size):
+        batch.append(invoice)
+        if len(batch) >= batch_size:
+            for report in await audit_batch():
+                yield report
+            batch = []
+    if batch:
+        for report in await audit_batch():
+            yield report
+    yield {"summary": {**counts, "seconds": round(time.perf_counter() - started, 3)}}
+
+
+# ============ GST SUMMARIES ============
+
+# Month-wise HSN and GST-rate summaries of the line items, for GSTR-1. A month is closed
+# once the IST calendar has moved past it: closed months are aggregated once and kept in
+# gst_summaries, the open month is aggregated on every request. An invoice write that
+# changes an amount in a closed month marks that month invalidated, which also stops an
+# aggregation already in flight from storing a result computed before the write.
+GST_RATE_EXPRESSION = {"$add": [
+    {"$ifNull": ["$items.cgst_percent", 0]},
+    {"$ifNull": ["$items.sgst_percent", 0]},
+    {"$ifNull": ["$items.igst_percent", 0]},
+]}
+GST_SUMMARY_GROUPS = {
+    "hsn": {"hsn": {"$ifNull": ["$items.hsn", ""]}, "uom": {"$ifNull": ["$items.uom", "pcs"]}, "gst_rate": GST_RATE_EXPRESSION},
+    "rate": {"gst_rate": GST_RATE_EXPRESSION},
+}
+GST_SUMMARY_AMOUNTS = {
+    "taxable_value": "taxable_amount", "cgst": "cgst_amount", "sgst": "sgst_amount",
+    "igst": "igst_amount", "total_value": "final_amount",
+}
+GST_SUMMARY_COLUMNS = {
+    group_by: [*key, "line_items", "qty", *GST_SUMMARY_AMOUNTS, "total_tax"]
+    for group_by, key in GST_SUMMARY_GROUPS.items()
+}
+
+
+def month_range(month: str):
+    """IST start of a YYYY-MM month and of the next one"""
+    try:
+        start = datetime.strptime(month, "%Y-%m").replace(tzinfo=IST)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start, end
+
+
+def is_closed_month(month: str) -> bool:
+    return month < datetime.now(IST).strftime("%Y-%m")
+
+
+def gst_summary_inputs(invoice: Optional[dict]):
+    """What an invoice contributes to the GST summaries; writes that keep it equal (payments) skip invalidation"""
+    if not invoice or invoice.get('is_deleted') or not invoice.get('invoice_date'):
+        return None
+    return business_day(invoice['invoice_date'])[:7], invoice.get('items')
+
+
+async def compute_gst_summary(month: str, group_by: str) -> List[dict]:
+    start, end = month_range(month)
+    pipeline = [
+        # Served by the active_by_invoice_date index
+        {"$match": {"is_deleted": False, "invoice_date": {"$gte": start, "$lt": end}}},
+        {"$project": {"_id": 0, "items": 1}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": GST_SUMMARY_GROUPS[group_by],
+            "line_items": {"$sum": 1},
+            "qty": {"$sum": "$items.qty"},
+            **{column: {"$sum": f"$items.{field}"} for column, field in GST_SUMMARY_AMOUNTS.items()},
+        }},
     ]
+    rows = []
+    async for group in db.invoices.aggregate(pipeline):
+        row = {**group['_id'], "line_items": group['line_items'], "qty": round(group['qty'], 3)}
+        row.update({column: round(group[column], 2) for column in GST_SUMMARY_AMOUNTS})
+        row['total_tax'] = round(row['cgst'] + row['sgst'] + row['igst'], 2)
+        rows.append(row)
+    rows.sort(key=lambda row: tuple(row[field] for field in GST_SUMMARY_GROUPS[group_by]))
+    return rows
+
+
+async def get_gst_summary(month: str, group_by: str):
+    """(rows, served from the closed-month cache)"""
+    key = f"{month}|{group_by}"
+    closed = is_closed_month(month)
+    if closed:
+        cached = await db.gst_summaries.find_one({"_id": key, "rows": {"$exists": True}})
+        if cached:
+            return cached['rows'], True
+
+    started = datetime.now(timezone.utc)
+    rows = await compute_gst_summary(month, group_by)
+    if closed:
+        try:
+            # Not stored if the month was invalidated after the aggregation started
+            await db.gst_summaries.replace_one(
+                {"_id": key, "$or": [{"invalidated_at": {"$lt": started}}, {"invalidated_at": {"$exists": False}}]},
+                {"month": month, "group_by": group_by, "rows": rows, "computed_at": started},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            pass
+    return rows, False
+
+
+async def invalidate_gst_summaries(changes: List[tuple]):
+    """Drop the cached summaries of closed months whose amounts a batch of invoice writes changed"""
+    months = set()
+    for before, after in changes:
+        old, new = gst_summary_inputs(before), gst_summary_inputs(after)
+        if old != new:
+            months.update(inputs[0] for inputs in (old, new) if inputs)
+    closed = [month for month in months if is_closed_month(month)]
+    if not closed:
+        return
+    now = datetime.now(timezone.utc)
+    await db.gst_summaries.bulk_write([
+        UpdateOne({"_id": f"{month}|{group_by}"}, {"$set": {"invalidated_at": now}, "$unset": {"rows": ""}}, upsert=True)
+        for month in closed for group_by in GST_SUMMARY_GROUPS
+    ], ordered=False)
+
+
+# ============ INVOICE PDFS ============
+
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', ROOT_DIR / 'pdf_cache'))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Renders one bulk download keeps in flight; the pool size still bounds the CPU used
+PDF_BULK_CONCURRENCY = int(os.environ.get('PDF_BULK_CONCURRENCY', str(PDF_WORKERS * 2)))
+MAX_BULK_PDF_INVOICES = int(os.environ.get('MAX_BULK_PDF_INVOICES', '1000'))
+
+
+async def load_logo(logo: Optional[str]) -> Optional[bytes]:
+    """Bytes of a business logo reference (or legacy data: URL), None if there is none"""
+    if not logo:
+        return None
+    if logo.startswith("data:"):
+        return base64.b64decode(logo.partition(",")[2])
+    if not logo.startswith(LOGO_URL_PREFIX):
+        return None
+    try:
+        stream = await logo_bucket().open_download_stream_by_name(logo[len(LOGO_URL_PREFIX):])
+    except NoFile:
+        return None
+    return await stream.read()
+
+
+class InvoicePdfRenderer:
+    """Renders invoice PDFs in a process pool, off the event loop, and caches them on disk.
+
+    A cached file is keyed by the invoice id, its updated_at and the admin business
+    version (id and updated_at), so editing either renders a fresh copy.
+    """
+
+    def __init__(self, cache_dir: Path, workers: int):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._pool = None
+        self.hits = 0
+        self.misses = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers only import invoice_pdf and never inherit the running event loop
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _file_prefix(self, invoice_id: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_-]", "_", invoice_id)
+
+    def cache_path(self, invoice: dict, business: Optional[dict]) -> Path:
+        business_version = f"{business['id']}@{business.get('updated_at')}" if business else "none"
+        key = f"{invoice['id']}|{invoice.get('updated_at')}|{business_version}|{RENDERER_VERSION}"
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return self.cache_dir / f"{self._file_prefix(invoice['id'])}.{digest}.pdf"
+
+    def _store(self, path: Path, pdf: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(pdf)
+        os.replace(temp_path, path)
+        # Renders of older versions of the invoice are stale now
+        for old_path in path.parent.glob(f"{path.name.split('.')[0]}.*.pdf"):
+            if old_path != path:
+                old_path.unlink(missing_ok=True)
+
+    async def render(self, invoice: dict, business: Optional[dict]) -> bytes:
+        path = self.cache_path(invoice, business)
+        try:
+            pdf = await asyncio.to_thread(path.read_bytes)
+            self.hits += 1
+            return pdf
+        except FileNotFoundError:
+            self.misses += 1
+
+        logo = await load_logo(business.get('logo')) if business else None
+        loop = asyncio.get_running_loop()
+        try:
+            pdf = await loop.run_in_executor(self._executor(), render_invoice_pdf, invoice, business, logo)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next render
+            self._pool = None
+            raise
+        await asyncio.to_thread(self._store, path, pdf)
+        return pdf
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "workers": self.workers, "cache_dir": str(self.cache_dir)}
+
+
+invoice_pdfs = InvoicePdfRenderer(PDF_CACHE_DIR, PDF_WORKERS)
+
+
+def invoice_pdf_filename(invoice: dict) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "-", invoice['invoice_number']) + ".pdf"
+
+
+# ============ ROUTES ============
+
+@api_router.get("/")
+async def root():
+    return {"message": "Billing App API"}
+
+
+# Business Routes
+@api_router.post("/businesses", response_model=Business)
+async def create_business(input: BusinessCreate):
+    input.logo = await externalize_logo(input.logo)
+    business_obj = Business(**input.model_dump())
+    doc = with_search_tokens("businesses", business_obj.model_dump())
+    encode_dates("businesses", doc)
+    
+    await db.businesses.insert_one(doc)
+    admin_business_cache.invalidate()
+    return business_obj
+
+# Computed per request from the linked customers, selectable with fields= like stored fields
+BUSINESS_LINKED_FIELDS = ("linked_customers", "linked_customers_count")
+
+@api_router.get("/businesses")
+async def get_businesses(
+    response: Response,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query = search_filter(search)
+    selected = sparse_fields(Business, fields, extra=BUSINESS_LINKED_FIELDS)
+    # A search without an explicit sort is ranked by relevance
+    rank_by_relevance = bool(query) and not sort_by
+    
+    # Stages applied to the page once it is sorted and limited
+    shape = []
+    if selected is not None:
+        business_fields = [field for field in selected if field not in BUSINESS_LINKED_FIELDS]
+        shape.append({"$project": model_projection(
+            Business, business_fields, list_read_fields(rank_by_relevance, sort_by),
+        )})
+    # Join linked customers server-side in the same aggregation instead of one query per business,
+    # and only when they are part of the response
+    if selected is None or any(field in selected for field in BUSINESS_LINKED_FIELDS):
+        shape += [
+            {"$lookup": {
+                "from": "customers",
+                "localField": "id",
+                "foreignField": "business_id",
+                "as": "linked_customers",
+            }},
+            {"$addFields": {
+                "linked_customers": "$linked_customers.name",
+                "linked_customers_count": {"$size": "$linked_customers"},
+            }},
+        ]
+    if selected is None:
+        shape.append({"$project": {"_id": 0, "search_tokens": 0}})
+
+    async def find(match: dict, sort, count: int) -> List[dict]:
+        pipeline = [{"$match": match}, {"$sort": dict(sort)}, {"$limit": count}, *shape]
+        return await db.businesses.aggregate(pipeline).to_list(None)
+
+    if rank_by_relevance:
+        businesses, next_cursor = await ranked_search(find, {}, search, limit, cursor)
+    else:
+        query, sort = keyset_query("businesses", query, sort_by, sort_order, cursor)
+        businesses, next_cursor = take_page(await find(query, sort, limit + 1), limit, sort_by, sort_order)
+    set_next_cursor(response, next_cursor)
+
+    return trusted_response(businesses, response=response, fields=selected)
+
+@api_router.get("/businesses/{business_id}", response_model=Business)
+async def get_business(business_id: str, request: Request, response: Response):
+    business = await read_entity(request, response, "businesses", business_id, "Business")
+    if isinstance(business, Response):
+        return business
+    
+    return Business(**business)
+
+@api_router.put("/businesses/{business_id}", response_model=Business)
+async def update_business(business_id: str, input: BusinessCreate, version: Optional[int] = None):
+    business_dict = input.model_dump()
+    business_dict['logo'] = await externalize_logo(business_dict['logo'])
+    business_dict['updated_at'] = datetime.now(timezone.utc)
+    with_search_tokens("businesses", business_dict)
+    encode_dates("businesses", business_dict)
+    
+    business = await db.businesses.find_one_and_update(
+        version_filter(business_id, version),
+        {"$set": business_dict, "$inc": {"version": 1}},
+        projection=DOCUMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not business:
+        await raise_missing("businesses", business_id, version, "Business")
+    admin_business_cache.invalidate()
+    
+    return Business(**business)
+
+@api_router.delete("/businesses/{business_id}")
+async def delete_business(business_id: str, version: Optional[int] = None):
+    business = await db.businesses.find_one_and_delete(version_filter(business_id, version), projection={"_id": 1})
+    if not business:
+        await raise_missing("businesses", business_id, version, "Business")
+    
+    admin_business_cache.invalidate()
+    return {"message": "Business deleted successfully"}
+
+# Admin Business Settings Routes (for Settings page and invoice calculations)
+@api_router.get("/business", response_model=Optional[Business])
+async def get_admin_business():
+    """Get admin business settings (first business in collection)"""
+    business = await admin_business_cache.get()
+    if not business:
+        return None
+    
+    return Business(**business)
+
+@api_router.post("/business", response_model=Business)
+async def save_admin_business(input: BusinessCreate):
+    """Save or update admin business settings"""
+    input.logo = await externalize_logo(input.logo)
+    business_dict = input.model_dump()
+    business_dict['updated_at'] = datetime.now(timezone.utc)
+    with_search_tokens("businesses", business_dict)
+    encode_dates("businesses", business_dict)
+    
+    # Update the existing admin business (first business in collection), if there is one
+    business = await db.businesses.find_one_and_update(
+        {},
+        {"$set": business_dict, "$inc": {"version": 1}},
+        projection=DOCUMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if business:
+        admin_business_cache.invalidate()
+        return Business(**business)
+    
+    # Create new admin business
+    business_obj = Business(**input.model_dump())
+    doc = with_search_tokens("businesses", business_obj.model_dump())
+    encode_dates("businesses", doc)
+    
+    await db.businesses.insert_one(doc)
+    admin_business_cache.invalidate()
+    return business_obj
+
+@api_router.post("/business/upload-logo")
+async def upload_business_logo(file: UploadFile = File(...)):
+    """Upload business logo into the logo store and reference it from the admin business"""
+    try:
+        contents = await file.read()
+        # Content-addressed, so a logo stored without a business to attach it to is harmless
+        logo_ref = await store_logo(contents, file.content_type)
+
+        business = await db.businesses.find_one_and_update(
+            {},
+            {"$set": {"logo": logo_ref, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+            projection={"_id": 1},
+        )
+        if not business:
+            raise HTTPException(status_code=404, detail="Business not found. Please save business details first.")
+        admin_business_cache.invalidate()
+        return {"message": "Logo uploaded successfully", "logo": logo_ref}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to upload logo: {str(e)}")
+
+@api_router.get("/logos/{digest}")
+async def get_logo(digest: str, request: Request):
+    """Stream a stored logo; content-addressed, so it can be cached forever"""
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": LOGO_CACHE_CONTROL}
+
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        stream = await logo_bucket().open_download_stream_by_name(digest)
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Logo not found")
+
+    async def chunks():
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    headers["Content-Length"] = str(stream.length)
+    media_type = (stream.metadata or {}).get("content_type", "application/octet-stream")
+    return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+
+# Customer Routes
+# Business fields a customer form (or import row) may carry in business_data
+CUSTOMER_BUSINESS_FIELDS = [
+    "legal_name", "nickname", "gstin", "state_code", "state", "city", "pan", "others",
+    "phone_1", "phone_2", "email_1", "email_2", "address_1", "address_2",
+]
+
+def business_from_data(business_data: dict) -> Business:
+    """Build the business that a customer with has_business_with_gst is linked to"""
+    return Business(**{field: business_data.get(field) for field in CUSTOMER_BUSINESS_FIELDS})
+
+@api_router.post("/customers", response_model=Customer)
+async def create_customer(input: CustomerCreate):
+    customer_data = input.model_dump(exclude={'business_data'})
+    
+    # Handle business logic
+    if input.has_business_with_gst:
+        if input.business_data and input.business_data.get('legal_name'):
+            business_data = input.business_data
+            
+            # Check if business with same GSTIN already exists
+            existing_business = None
+            if business_data.get('gstin'):
+                existing_business = await db.businesses.find_one(
+                    {"gstin": business_data['gstin']}, 
+                    {"_id": 0}
+                )
+            
+            if existing_business:
+                # Link to existing business
+                customer_data['business_id'] = existing_business['id']
+                customer_data['business_name'] = existing_business['legal_name']
+            else:
+                # Create new business
+                business_obj = business_from_data(business_data)
+                business_doc = with_search_tokens("businesses", business_obj.model_dump())
+                encode_dates("businesses", business_doc)
+                await db.businesses.insert_one(business_doc)
+                
+                customer_data['business_id'] = business_obj.id
+                customer_data['business_name'] = business_obj.legal_name
+        else:
+            customer_data['business_name'] = "NA"
+    else:
+        customer_data['business_name'] = "NA"
+    
+    customer_obj = Customer(**customer_data)
+    doc = with_search_tokens("customers", customer_obj.model_dump())
+    encode_dates("customers", doc)
+    
+    await db.customers.insert_one(doc)
+    return customer_obj
+
+@api_router.get("/customers", response_model=List[Customer])
+async def get_customers(
+    response: Response,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query = search_filter(search)
+    selected = sparse_fields(Customer, fields)
+    ranked = bool(query) and not sort_by
+    projection = model_projection(Customer, selected, list_read_fields(ranked, sort_by))
+    
+    if ranked:
+        customers, next_cursor = await ranked_search(
+            lambda match, sort, count: db.customers.find(match, projection).sort(sort).limit(count).to_list(None),
+            {}, search, limit, cursor,
+        )
+    else:
+        query, sort = keyset_query("customers", query, sort_by, sort_order, cursor)
+        customers = await db.customers.find(query, projection).sort(sort).limit(limit + 1).to_list(None)
+        customers, next_cursor = take_page(customers, limit, sort_by, sort_order)
+    set_next_cursor(response, next_cursor)
+    
+    return trusted_response(customers, Customer, response, selected)
+
+@api_router.get("/customers/{customer_id}", response_model=Customer)
+async def get_customer(customer_id: str, request: Request, response: Response):
+    customer = await read_entity(request, response, "customers", customer_id, "Customer")
+    if isinstance(customer, Response):
+        return customer
+    
+    return Customer(**customer)
+
+@api_router.get("/customers/{customer_id}/statement")
+async def get_customer_statement(customer_id: str):
+    """Outstanding balance, aging and open invoices of a customer"""
+    customer, balance, open_invoices = await asyncio.gather(
+        db.customers.find_one({"id": customer_id}, {"_id": 0, "id": 1, "name": 1}),
+        db.customer_balances.find_one({"_id": customer_id}),
+        db.invoices.find(
+            {"customer_id": customer_id, "is_deleted": False, "payment_status": {"$in": ["unpaid", "partial"]}},
+            {"_id": 0, "id": 1, "invoice_number": 1, "invoice_date": 1, "payment_status": 1,
+             "grand_total": 1, "paid_amount": 1, "balance_due": 1},
+        ).sort("invoice_date", 1).to_list(None),
+    )
+    if not customer and not balance:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    today = datetime.now(IST).date()
+    statement = balance_summary(balance or {"_id": customer_id}, today)
+    if customer:
+        statement['customer_name'] = customer.get('name')
+    for invoice in open_invoices:
+        invoice['due_amount'] = invoice_outstanding(invoice) / 100
+        invoice['age_days'] = max((today - date.fromisoformat(business_day(invoice['invoice_date']))).days, 0)
+    statement['invoices'] = open_invoices
+    return statement
+
+@api_router.put("/customers/{customer_id}", response_model=Customer)
+async def update_customer(customer_id: str, input: CustomerCreate, version: Optional[int] = None):
+    customer_dict = input.model_dump(exclude={'business_data'})
+    
+    # Handle business logic
+    if input.has_business_with_gst:
+        if input.business_data and input.business_data.get('legal_name'):
+            business_data = input.business_data
+            
+            # Check if business with same GSTIN already exists
+            existing_business = None
+            if business_data.get('gstin'):
+                existing_business = await db.businesses.find_one(
+                    {"gstin": business_data['gstin']}, 
+                    {"_id": 0}
+                )
+            
+            if existing_business:
+                # Link to existing business
+                customer_dict['business_id'] = existing_business['id']
+                customer_dict['business_name'] = existing_business['legal_name']
+            else:
+                # Create new business
+                business_obj = business_from_data(business_data)
+                business_doc = with_search_tokens("businesses", business_obj.model_dump())
+                encode_dates("businesses", business_doc)
+                await db.businesses.insert_one(business_doc)
+                
+                customer_dict['business_id'] = business_obj.id
+                customer_dict['business_name'] = business_obj.legal_name
+        else:
+            customer_dict['business_name'] = "NA"
+            customer_dict['business_id'] = None
+    else:
+        customer_dict['business_name'] = "NA"
+        customer_dict['business_id'] = None
+    
+    customer_dict['updated_at'] = datetime.now(timezone.utc)
+    with_search_tokens("customers", customer_dict)
+    encode_dates("customers", customer_dict)
+    
+    customer = await db.customers.find_one_and_update(
+        version_filter(customer_id, version),
+        {"$set": customer_dict, "$inc": {"version": 1}},
+        projection=DOCUMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not customer:
+        await raise_missing("customers", customer_id, version, "Customer")
+    
+    return Customer(**customer)
+
+@api_router.delete("/customers/{customer_id}")
+async def delete_customer(customer_id: str, version: Optional[int] = None):
+    customer = await db.customers.find_one_and_delete(version_filter(customer_id, version), projection={"_id": 1})
+    if not customer:
+        await raise_missing("customers", customer_id, version, "Customer")
+    
+    return {"message": "Customer deleted successfully"}
+
+
+# Product Routes
+@api_router.post("/products", response_model=Product)
+async def create_product(input: ProductCreate):
+    product_obj = Product(**input.model_dump())
+    doc = with_search_tokens("products", product_obj.model_dump())
+    encode_dates("products", doc)
+    
+    await db.products.insert_one(doc)
+    return product_obj
+
+@api_router.get("/products", response_model=List[Product])
+async def get_products(
+    response: Response,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query = search_filter(search)
+    selected = sparse_fields(Product, fields)
+    ranked = bool(query) and not sort_by
+    projection = model_projection(Product, selected, list_read_fields(ranked, sort_by))
+    
+    if ranked:
+        products, next_cursor = await ranked_search(
+            lambda match, sort, count: db.products.find(match, projection).sort(sort).limit(count).to_list(None),
+            {}, search, limit, cursor,
+        )
+    else:
+        query, sort = keyset_query("products", query, sort_by, sort_order, cursor)
+        products = await db.products.find(query, projection).sort(sort).limit(limit + 1).to_list(None)
+        products, next_cursor = take_page(products, limit, sort_by, sort_order)
+    set_next_cursor(response, next_cursor)
+    
+    return trusted_response(products, Product, response, selected)
+
+@api_router.get("/products/{product_id}", response_model=Product)
+async def get_product(product_id: str, request: Request, response: Response):
+    product = await read_entity(request, response, "products", product_id, "Product")
+    if isinstance(product, Response):
+        return product
+    
+    return Product(**product)
+
+@api_router.put("/products/{product_id}", response_model=Product)
+async def update_product(product_id: str, input: ProductCreate, version: Optional[int] = None):
+    product_dict = input.model_dump()
+    product_dict['updated_at'] = datetime.now(timezone.utc)
+    with_search_tokens("products", product_dict)
+    encode_dates("products", product_dict)
+    
+    product = await db.products.find_one_and_update(
+        version_filter(product_id, version),
+        {"$set": product_dict, "$inc": {"version": 1}},
+        projection=DOCUMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not product:
+        await raise_missing("products", product_id, version, "Product")
+    
+    return Product(**product)
+
+@api_router.delete("/products/{product_id}")
+async def delete_product(product_id: str, version: Optional[int] = None):
+    product = await db.products.find_one_and_delete(version_filter(product_id, version), projection={"_id": 1})
+    if not product:
+        await raise_missing("products", product_id, version, "Product")
+    
+    return {"message": "Product deleted successfully"}
+
+
+# Bulk Import Routes
+IMPORT_BATCH_SIZE = 1000
+
+
+def _import_format(file: UploadFile, format: Optional[str]) -> str:
+    if format:
+        return format
+    filename = (file.filename or "").lower()
+    if filename.endswith((".ndjson", ".jsonl", ".json")) or "json" in (file.content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def _read_import_rows(file: UploadFile, format: str):
+    """Yield (row_no, row) pairs, row_no being 1-based and excluding the CSV header.
+
+    A row that cannot be parsed is yielded as a string describing the problem.
+    """
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    if format == "ndjson":
+        row_no = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row_no += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_no, f"Invalid JSON: {e}"
+                continue
+            yield row_no, row if isinstance(row, dict) else "Each line must be a JSON object"
+    else:
+        for row_no, row in enumerate(csv.DictReader(text), start=1):
+            # CSV has no null: blank cells mean "not provided"
+            yield row_no, {key: value for key, value in row.items() if key and value not in ("", None)}
+
+
+def _validation_errors(e: ValidationError) -> List[dict]:
+    return [{"field": ".".join(str(part) for part in error['loc']), "message": error['msg']} for error in e.errors()]
+
+
+def _report_row_error(report: dict, row_no: int, errors: List[dict]):
+    report['failed'] += 1
+    report['errors'].append({"row": row_no, "errors": errors})
+
+
+def _report_insert_errors(report: dict, e: BulkWriteError, doc_rows: List[int]):
+    for error in e.details.get('writeErrors', []):
+        _report_row_error(report, doc_rows[error['index']], [{"field": None, "message": error.get('errmsg', 'Write failed')}])
+
+
+async def _run_import(file: UploadFile, format: Optional[str], import_batch) -> dict:
+    report = {"received": 0, "inserted": 0, "failed": 0, "businesses_created": 0, "errors": []}
+    rows = _read_import_rows(file, _import_format(file, format))
+    while True:
+        # Reading and parsing the upload is blocking file I/O: do it a batch at a time off the event loop
+        parsed = await asyncio.to_thread(lambda: list(itertools.islice(rows, IMPORT_BATCH_SIZE)))
+        if not parsed:
+            break
+        batch = []
+        for row_no, row in parsed:
+            report['received'] += 1
+            if isinstance(row, str):
+                _report_row_error(report, row_no, [{"field": None, "message": row}])
+                continue
+            batch.append((row_no, row))
+        if batch:
+            await import_batch(batch, report)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+
+def _customer_import_fields(row: dict) -> dict:
+    """CSV rows carry the linked business as business_<field> columns; NDJSON may nest business_data"""
+    fields = {key: value for key, value in row.items() if not key.startswith("business_")}
+    business_data = dict(row.get('business_data') or {})
+    business_data.update({key[len("business_"):]: value for key, value in row.items() if key.startswith("business_") and key != "business_data"})
+    if business_data:
+        fields['business_data'] = business_data
+    return fields
+
+
+async def _import_customer_batch(rows: List[tuple], report: dict):
+    candidates = []
+    for row_no, row in rows:
+        try:
+            candidates.append((row_no, CustomerCreate(**_customer_import_fields(row))))
+        except ValidationError as e:
+            _report_row_error(report, row_no, _validation_errors(e))
+
+    def linked_business_data(customer: CustomerCreate) -> Optional[dict]:
+        if customer.has_business_with_gst and customer.business_data and customer.business_data.get('legal_name'):
+            return customer.business_data
+        return None
+
+    # Resolve every GSTIN in the batch with a single query
+    gstins = list({data['gstin'] for _, c in candidates if (data := linked_business_data(c)) and data.get('gstin')})
+    businesses_by_gstin = {}
+    if gstins:
+        async for business in db.businesses.find({"gstin": {"$in": gstins}}, {"_id": 0, "id": 1, "legal_name": 1, "gstin": 1}):
+            businesses_by_gstin[business['gstin']] = business
+
+    new_businesses = []
+    docs = []
+    doc_rows = []
+    for row_no, customer in candidates:
+        customer_data = customer.model_dump(exclude={'business_data'})
+        customer_data['business_name'] = "NA"
+
+        business_data = linked_business_data(customer)
+        if business_data:
+            business = businesses_by_gstin.get(business_data.get('gstin'))
+            if not business:
+                try:
+                    business = with_search_tokens("businesses", business_from_data(business_data).model_dump())
+                except ValidationError as e:
+                    _report_row_error(report, row_no, _validation_errors(e))
+                    continue
+                encode_dates("businesses", business)
+                new_businesses.append(business)
+                if business.get('gstin'):
+                    businesses_by_gstin[business['gstin']] = business
+            customer_data['business_id'] = business['id']
+            customer_data['business_name'] = business['legal_name']
+
+        try:
+            doc = with_search_tokens("customers", Customer(**customer_data).model_dump())
+        except ValidationError as e:
+            _report_row_error(report, row_no, _validation_errors(e))
+            continue
+        encode_dates("customers", doc)
+        docs.append(doc)
+        doc_rows.append(row_no)
+
+    if new_businesses:
+        try:
+            await db.businesses.insert_many(new_businesses, ordered=False)
+            report['businesses_created'] += len(new_businesses)
+        except BulkWriteError as e:
+            # Another writer created some of these GSTINs first: link the customers to theirs
+            failed = [new_businesses[error['index']] for error in e.details.get('writeErrors', [])]
+            report['businesses_created'] += len(new_businesses) - len(failed)
+            failed_gstins = [business['gstin'] for business in failed if business.get('gstin')]
+            existing = {
+                business['gstin']: business
+                async for business in db.businesses.find({"gstin": {"$in": failed_gstins}}, {"_id": 0, "id": 1, "gstin": 1})
+            }
+            replaced_ids = {business['id']: existing[business['gstin']]['id'] for business in failed if business.get('gstin') in existing}
+            for doc in docs:
+                doc['business_id'] = replaced_ids.get(doc['business_id'], doc['business_id'])
+        admin_business_cache.invalidate()
+
+    if docs:
+        try:
+            result = await db.customers.insert_many(docs, ordered=False)
+            report['inserted'] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            report['inserted'] += e.details.get('nInserted', 0)
+            _report_insert_errors(report, e, doc_rows)
+
+
+async def _import_product_batch(rows: List[tuple], report: dict):
+    docs = []
+    doc_rows = []
+    for row_no, row in rows:
+        try:
+            product_obj = Product(**ProductCreate(**row).model_dump())
+        except ValidationError as e:
+            _report_row_error(report, row_no, _validation_errors(e))
+            continue
+        doc = with_search_tokens("products", product_obj.model_dump())
+        encode_dates("products", doc)
+        docs.append(doc)
+        doc_rows.append(row_no)
+
+    if docs:
+        try:
+            result = await db.products.insert_many(docs, ordered=False)
+            report['inserted'] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            report['inserted'] += e.details.get('nInserted', 0)
+            _report_insert_errors(report, e, doc_rows)
+
+
+@api_router.post("/customers/import")
+async def import_customers(file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")):
+    """Bulk-create customers from a CSV or NDJSON upload and report per-row errors.
+
+    A linked business is given as business_<field> CSV columns (or a nested business_data object in
+    NDJSON); businesses are matched by GSTIN and created when missing, just like POST /customers.
+    """
+    return await _run_import(file, format, _import_customer_batch)
+
+@api_router.post("/products/import")
+async def import_products(file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")):
+    """Bulk-create products from a CSV or NDJSON upload and report per-row errors"""
+    return await _run_import(file, format, _import_product_batch)
+
+
+# Invoice Routes
+# view=summary: what the invoice list and archives show, without items and addresses
+INVOICE_SUMMARY_FIELDS = [
+    "id", "invoice_number", "invoice_date", "customer_id", "customer_name", "customer_business_name",
+    "grand_total", "paid_amount", "balance_due", "payment_status", "payment_method",
+    "is_deleted", "deleted_at", "created_at", "updated_at",
+]
+
+def invoice_list_query(start_date: Optional[str], end_date: Optional[str], include_deleted: bool) -> dict:
+    """Filter shared by the invoice list and exports; include_deleted=True selects the archives"""
+    query = {"is_deleted": False} if not include_deleted else {"is_deleted": True}
+    
+    # Date range filter
+    date_query = date_range_filter(start_date, end_date)
+    if date_query:
+        query["invoice_date"] = date_query
+    
+    return query
+
+@api_router.post("/invoices", response_model=Invoice)
+async def create_invoice(input: InvoiceCreate):
+    invoice_obj = Invoice(**await price_invoice(input.model_dump()), invoice_number="")
+    # The series depends on the (parsed) invoice date, so the number is allocated second
+    invoice_obj.invoice_number = await invoice_numbers.next_number(invoice_obj.invoice_date)
+    
+    doc = with_search_tokens("invoices", invoice_obj.model_dump())
+    encode_dates("invoices", doc)
+    
+    await db.invoices.insert_one(doc)
+    await record_invoice_change(None, doc)
+    # The stored (UTC) dates, as every later read returns them
+    return Invoice(**doc)
+
+@api_router.get("/invoices", response_model=List[Invoice])
+async def get_invoices(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    include_deleted: bool = False,
+    fields: Optional[str] = None,
+    view: Optional[str] = Query(None, pattern="^(summary|full)$")
+):
+    query = invoice_list_query(start_date, end_date, include_deleted)
+    query.update(search_filter(search))
+    # An explicit fields= list wins over the view
+    selected = sparse_fields(Invoice, fields)
+    if selected is None and view == "summary":
+        selected = INVOICE_SUMMARY_FIELDS
+    ranked = "search_tokens" in query and not sort_by
+    projection = model_projection(Invoice, selected, list_read_fields(ranked, sort_by))
+    
+    if ranked:
+        query.pop("search_tokens")
+        invoices, next_cursor = await ranked_search(
+            lambda match, sort, count: db.invoices.find(match, projection).sort(sort).limit(count).to_list(None),
+            query, search, limit, cursor,
+        )
+    else:
+        query, sort = keyset_query("invoices", query, sort_by, sort_order, cursor)
+        invoices = await db.invoices.find(query, projection).sort(sort).limit(limit + 1).to_list(None)
+        invoices, next_cursor = take_page(invoices, limit, sort_by, sort_order)
+    set_next_cursor(response, next_cursor)
+    
+    return trusted_response(invoices, Invoice, response, selected)
+
+# Invoice Exports
+INVOICE_EXPORT_COLUMNS = [field for field in Invoice.model_fields if field != "items"]
+# Invoice fields repeated on every line-item row
+INVOICE_ITEM_EXPORT_INVOICE_FIELDS = [
+    "invoice_number", "invoice_date", "customer_id", "customer_name",
+    "customer_gstin", "payment_status", "is_deleted",
+]
+INVOICE_ITEM_EXPORT_COLUMNS = ["invoice_id", *INVOICE_ITEM_EXPORT_INVOICE_FIELDS, "line_no", *InvoiceItem.model_fields]
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+async def _export_invoice_rows(query: dict, line_items: bool):
+    """Yield export rows straight off a Motor cursor, one invoice at a time"""
+    projection = {"_id": 0, "search_tokens": 0} if line_items else {"_id": 0, "search_tokens": 0, "items": 0}
+    cursor = db.invoices.find(query, projection).sort([("invoice_date", ASCENDING), ("id", ASCENDING)]).batch_size(500)
+    async for invoice in cursor:
+        for field in DATE_FIELDS["invoices"]:
+            if isinstance(invoice.get(field), datetime):
+                invoice[field] = invoice[field].isoformat()
+        if not line_items:
+            yield invoice
+            continue
+        for line_no, item in enumerate(invoice.get('items') or [], start=1):
+            yield {
+                "invoice_id": invoice['id'],
+                **{field: invoice.get(field) for field in INVOICE_ITEM_EXPORT_INVOICE_FIELDS},
+                "line_no": line_no,
+                **item,
+            }
+
+
+async def _stream_csv(rows, columns: List[str]):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _stream_ndjson(rows):
+    chunk = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(row, default=str) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    yield "".join(chunk)
+
+
+def _export_response(rows, columns: List[str], format: str, filename: str) -> StreamingResponse:
+    if format == "ndjson":
+        body, media_type = _stream_ndjson(rows), "application/x-ndjson"
+    else:
+        body, media_type = _stream_csv(rows, columns), "text/csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+
+@api_router.get("/invoices/export")
+async def export_invoices(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_deleted: bool = False
+):
+    """Stream every matching invoice (without line items) as CSV or NDJSON"""
+    query = invoice_list_query(start_date, end_date, include_deleted)
+    rows = _export_invoice_rows(query, line_items=False)
+    return _export_response(rows, INVOICE_EXPORT_COLUMNS, format, "invoices")
+
+@api_router.get("/invoices/export/items")
+async def export_invoice_items(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_deleted: bool = False
+):
+    """Stream one row per invoice line item, with the invoice's identifying fields repeated"""
+    query = invoice_list_query(start_date, end_date, include_deleted)
+    rows = _export_invoice_rows(query, line_items=True)
+    return _export_response(rows, INVOICE_ITEM_EXPORT_COLUMNS, format, "invoice-items")
+
+@api_router.get("/invoices/export/pdf")
+async def export_invoice_pdfs(
+    start_date: str,
+    end_date: str,
+    include_deleted: bool = False
+):
+    """Zip of the PDFs of every invoice in a date range, rendered with bounded parallelism"""
+    query = invoice_list_query(start_date, end_date, include_deleted)
+    count = await db.invoices.count_documents(query)
+    if count > MAX_BULK_PDF_INVOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{count} invoices in range; at most {MAX_BULK_PDF_INVOICES} can be downloaded at once",
+        )
+
+    invoices, business = await asyncio.gather(
+        db.invoices.find(query, {"_id": 0, "search_tokens": 0}).sort([("invoice_date", ASCENDING), ("id", ASCENDING)]).to_list(None),
+        admin_business_cache.get(),
+    )
+    semaphore = asyncio.Semaphore(PDF_BULK_CONCURRENCY)
+
+    async def render(invoice: dict):
+        async with semaphore:
+            return invoice_pdf_filename(invoice), await invoice_pdfs.render(invoice, business)
+
+    files = await asyncio.gather(*(render(invoice) for invoice in invoices))
+
+    def build_zip() -> bytes:
+        buffer = io.BytesIO()
+        # PDFs are already compressed
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for name, pdf in files:
+                archive.writestr(name, pdf)
+        return buffer.getvalue()
+
+    filename = f"invoices_{start_date[:10]}_{end_date[:10]}.zip"
+    return Response(
+        await asyncio.to_thread(build_zip),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@api_router.get("/invoices/{invoice_id}", response_model=Invoice)
+async def get_invoice(invoice_id: str, request: Request, response: Response):
+    invoice = await read_entity(request, response, "invoices", invoice_id, "Invoice")
+    if isinstance(invoice, Response):
+        return invoice
+    
+    return Invoice(**invoice)
+
+@api_router.get("/invoices/{invoice_id}/pdf")
+async def get_invoice_pdf(invoice_id: str):
+    invoice, business = await asyncio.gather(
+        db.invoices.find_one({"id": invoice_id}, {"_id": 0, "search_tokens": 0}),
+        admin_business_cache.get(),
+    )
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    pdf = await invoice_pdfs.render(invoice, business)
+    return Response(
+        pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="{invoice_pdf_filename(invoice)}"'},
+    )
+
+# Invoice writes return the document as it was before the update: the rollup and balance
+# deltas need the old values, and the new document is the old one with the $set applied.
+async def update_invoice_document(invoice_id: str, version: Optional[int], set_fields: dict, projection: dict) -> dict:
+    before = await db.invoices.find_one_and_update(
+        version_filter(invoice_id, version),
+        {"$set": set_fields, "$inc": {"version": 1}},
+        projection=projection,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not before:
+        await raise_missing("invoices", invoice_id, version, "Invoice")
+    after = {**before, **set_fields, "version": (before.get('version') or 0) + 1}
+    await record_invoice_change(before, after)
+    return after
+
+@api_router.put("/invoices/{invoice_id}/payment", response_model=Invoice)
+async def update_payment_status(invoice_id: str, payment_status: str, payment_method: Optional[str] = None, version: Optional[int] = None):
+    update_data = {
+        "payment_status": payment_status,
+        "updated_at": datetime.now(timezone.utc)
+    }
+    
+    if payment_method:
+        update_data["payment_method"] = payment_method
+    
+    invoice = await update_invoice_document(invoice_id, version, update_data, DOCUMENT_PROJECTION)
+    return Invoice(**invoice)
+
+@api_router.put("/invoices/{invoice_id}", response_model=Invoice)
+async def update_invoice(invoice_id: str, input: InvoiceCreate, version: Optional[int] = None):
+    invoice_dict = await price_invoice(input.model_dump())
+    invoice_dict['updated_at'] = datetime.now(timezone.utc)
+    
+    # Preserve original invoice_date if not provided
+    if not invoice_dict.get('invoice_date'):
+        del invoice_dict['invoice_date']
+    encode_dates("invoices", invoice_dict)
+    
+    invoice = await update_invoice_document(invoice_id, version, invoice_dict, {"_id": 0})
+    
+    # Search tokens also cover the stored invoice_number, so they are only known now;
+    # they change only when the customer name does
+    search_tokens = build_search_tokens("invoices", invoice)
+    if search_tokens != invoice.pop('search_tokens', None):
+        await db.invoices.update_one(
+            {"id": invoice_id, "version": invoice['version']},
+            {"$set": {"search_tokens": search_tokens}},
+        )
     
-    if search:
-        hsn_codes = [hsn for hsn in hsn_codes if search.lower() in hsn['code'].lower() or search.lower() in hsn['description'].lower()]
+    return Invoice(**invoice)
+
+@api_router.delete("/invoices/{invoice_id}")
+async def soft_delete_invoice(invoice_id: str, version: Optional[int] = None):
+    now = datetime.now(timezone.utc)
+    await update_invoice_document(
+        invoice_id, version, {"is_deleted": True, "deleted_at": now, "updated_at": now}, DOCUMENT_PROJECTION,
+    )
+    return {"message": "Invoice moved to archives"}
+
+@api_router.post("/invoices/{invoice_id}/restore")
+async def restore_invoice(invoice_id: str, version: Optional[int] = None):
+    await update_invoice_document(
+        invoice_id, version, {"is_deleted": False, "deleted_at": None, "updated_at": datetime.now(timezone.utc)},
+        DOCUMENT_PROJECTION,
+    )
+    return {"message": "Invoice restored successfully"}
+
+MAX_BULK_INVOICE_IDS = int(os.environ.get('MAX_BULK_INVOICE_IDS', '1000'))
+
+# Fields a bulk operation reads before writing: enough to spot no-ops and move the aggregates
+INVOICE_BULK_PROJECTION = {
+    "_id": 0, "id": 1, "version": 1, "customer_id": 1, "customer_name": 1, "invoice_date": 1,
+    "payment_status": 1, "payment_method": 1, "grand_total": 1, "balance_due": 1, "is_deleted": 1,
+}
+
+def bulk_invoice_changes(input: InvoiceBulkRequest, now: datetime) -> dict:
+    if input.operation == "payment":
+        if not input.payment_status:
+            raise HTTPException(status_code=400, detail="payment_status is required for the payment operation")
+        changes = {"payment_status": input.payment_status}
+        if input.payment_method:
+            changes["payment_method"] = input.payment_method
+        return changes
+    if input.operation == "archive":
+        return {"is_deleted": True, "deleted_at": now}
+    if input.operation == "restore":
+        return {"is_deleted": False, "deleted_at": None}
+    raise HTTPException(status_code=400, detail="operation must be one of: payment, archive, restore")
+
+@api_router.post("/invoices/bulk")
+async def bulk_update_invoices(input: InvoiceBulkRequest):
+    """Apply one operation to many invoices with a single bulk_write; reports the outcome per id"""
+    ids = list(dict.fromkeys(input.ids))
+    if len(ids) > MAX_BULK_INVOICE_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(ids)} invoices given; at most {MAX_BULK_INVOICE_IDS} can be updated at once",
+        )
+    now = to_utc(datetime.now(timezone.utc))
+    changes = bulk_invoice_changes(input, now)
+
+    invoices = {
+        invoice['id']: invoice
+        async for invoice in db.invoices.find({"id": {"$in": ids}}, INVOICE_BULK_PROJECTION)
+    }
+    outcomes, pending, ops = {}, [], []
+    for invoice_id in ids:
+        before = invoices.get(invoice_id)
+        if not before:
+            outcomes[invoice_id] = "not_found"
+        elif all(before.get(field) == value for field, value in changes.items() if field != "deleted_at"):
+            outcomes[invoice_id] = "unchanged"
+        else:
+            # Guarded on the version that was read, so a concurrent edit is neither overwritten
+            # nor counted twice in the aggregates
+            pending.append(before)
+            ops.append(UpdateOne(
+                version_filter(invoice_id, before.get('version') or 0),
+                {"$set": {**changes, "updated_at": now}, "$inc": {"version": 1}},
+            ))
+
+    applied = pending
+    if ops:
+        result = await db.invoices.bulk_write(ops, ordered=False)
+        if result.matched_count < len(ops):
+            # Some invoices changed between the read and the write; find out which writes landed
+            current = {
+                invoice['id']: invoice
+                async for invoice in db.invoices.find(
+                    {"id": {"$in": [before['id'] for before in pending]}},
+                    {"_id": 0, "id": 1, "version": 1, "updated_at": 1},
+                )
+            }
+            applied = []
+            for before in pending:
+                landed = current.get(before['id']) or {}
+                if landed.get('version') == (before.get('version') or 0) + 1 and landed.get('updated_at') == now:
+                    applied.append(before)
+                else:
+                    outcomes[before['id']] = "conflict"
+        for before in applied:
+            outcomes[before['id']] = "updated"
+        # Dashboard rollups and customer balances move once for the whole batch
+        await record_invoice_changes([(before, {**before, **changes}) for before in applied])
+
+    return {
+        "operation": input.operation,
+        "updated": len(applied),
+        "results": [{"id": invoice_id, "status": outcomes[invoice_id]} for invoice_id in ids],
+    }
+
+
+# Master Data Routes
+GST_RATES = [
+    {"value": 0, "label": "0%"},
+    {"value": 5, "label": "5%"},
+    {"value": 12, "label": "12%"},
+    {"value": 18, "label": "18%"},
+    {"value": 28, "label": "28%"},
+]
+# Common HSN codes for sports clothing
+HSN_CODES = [
+    {"code": "6101", "description": "Men's or boys' overcoats, anoraks, windcheaters"},
+    {"code": "6102", "description": "Women's or girls' overcoats, anoraks, windcheaters"},
+    {"code": "6103", "description": "Men's or boys' suits, ensembles, jackets, trousers"},
+    {"code": "6104", "description": "Women's or girls' suits, ensembles, jackets, dresses, skirts"},
+    {"code": "6105", "description": "Men's or boys' shirts, knitted or crocheted"},
+    {"code": "6106", "description": "Women's or girls' blouses, shirts, knitted or crocheted"},
+    {"code": "6109", "description": "T-shirts, singlets and other vests, knitted or crocheted"},
+    {"code": "6110", "description": "Jerseys, pullovers, cardigans, waistcoats"},
+    {"code": "6111", "description": "Babies' garments and clothing accessories"},
+    {"code": "6112", "description": "Track suits, ski suits and swimwear, knitted"},
+    {"code": "6114", "description": "Other garments, knitted or crocheted"},
+    {"code": "6115", "description": "Panty hose, tights, stockings, socks"},
+    {"code": "6116", "description": "Gloves, mittens and mitts, knitted or crocheted"},
+    {"code": "6117", "description": "Other made up clothing accessories"},
+]
+GST_RATES_RESPONSE = PrecomputedJSON(GST_RATES)
+HSN_CODES_RESPONSE = PrecomputedJSON(HSN_CODES)
+
+@api_router.get("/gst-rates")
+async def get_gst_rates(request: Request):
+    return GST_RATES_RESPONSE.response(request)
+
+@api_router.get("/hsn-codes")
+async def get_hsn_codes(request: Request, search: Optional[str] = None):
+    if not search:
+        return HSN_CODES_RESPONSE.response(request)
     
-    return hsn_codes
+    matches = [hsn for hsn in HSN_CODES if search.lower() in hsn['code'].lower() or search.lower() in hsn['description'].lower()]
+    return JSONResponse(matches, headers={"Cache-Control": MASTER_DATA_CACHE_CONTROL})
 
 
 # Dashboard Routes
@@ -881,82 +2671,272 @@ async def get_dashboard_stats(
     """
     Get dashboard statistics for a date range
     - Total sales (sum of grand_total for invoices in date range)
-    - Pending dues (sum of balance_due for unpaid + partial invoices)
-    - TOP 5 customers with highest dues
+    - Pending dues (sum of balance_due for unpaid + partial invoices), from the customer balance ledger
+    - TOP 5 invoices with highest dues, each status read in due order from its index
     """
     # Build query for date range
-    query = {"is_deleted": False}
-    
-    if start_date or end_date:
-        date_query = {}
-        if start_date:
-            date_query["$gte"] = start_date
-        if end_date:
-            date_query["$lte"] = end_date
-        if date_query:
-            query["invoice_date"] = date_query
-    
-    # Get invoices for the date range
-    invoices = await db.invoices.find(query, {"_id": 0}).to_list(10000)
+    query = invoice_list_query(start_date, end_date, include_deleted=False)
+    
+    # Total sales over the date range
+    sales_pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_sales": {"$sum": {"$ifNull": ["$grand_total", 0]}},
+            "invoice_count": {"$sum": 1},
+        }},
+    ]
     
-    # Calculate total sales (sum of grand_total)
-    total_sales = sum(inv.get('grand_total', 0) for inv in invoices)
+    # Pending dues (unpaid + partial invoices) are kept per customer by the balance ledger
+    pending_dues_pipeline = [
+        {"$match": {"outstanding": {"$gt": 0}}},
+        {"$group": {"_id": None, "total_pending_dues": {"$sum": "$outstanding"}}},
+    ]
     
-    # Calculate pending dues (unpaid + partial invoices)
-    pending_dues_query = {
-        "is_deleted": False,
-        "payment_status": {"$in": ["unpaid", "partial"]}
+    # Unpaid invoices owe the grand total and partial ones the balance, so the largest dues
+    # are the first few of each status in that field's index order
+    projection = {
+        "_id": 0, "id": 1, "invoice_number": 1, "customer_id": 1, "customer_name": 1, "invoice_date": 1,
+        "payment_status": 1, "grand_total": 1, "paid_amount": 1, "balance_due": 1,
     }
     
-    pending_invoices = await db.invoices.find(pending_dues_query, {"_id": 0}).to_list(10000)
-    
-    total_pending_dues = 0
-    invoice_dues = []
-    
-    for inv in pending_invoices:
-        due_amount = 0
-        if inv.get('payment_status') == 'unpaid':
-            due_amount = inv.get('grand_total', 0)
-        elif inv.get('payment_status') == 'partial':
-            due_amount = inv.get('balance_due', 0)
-        
-        total_pending_dues += due_amount
-        
-        # Add individual invoice to the list
-        invoice_dues.append({
-            'invoice_id': inv.get('id'),
-            'invoice_number': inv.get('invoice_number'),
-            'customer_id': inv.get('customer_id'),
-            'customer_name': inv.get('customer_name'),
-            'invoice_date': inv.get('invoice_date'),
-            'payment_status': inv.get('payment_status'),
-            'grand_total': inv.get('grand_total', 0),
-            'paid_amount': inv.get('paid_amount', 0),
-            'due_amount': due_amount
-        })
+    def largest(status: str, due_field: str):
+        query = {"is_deleted": False, "payment_status": status}
+        return db.invoices.find(query, projection).sort([(due_field, DESCENDING), ("id", ASCENDING)]).limit(5).to_list(None)
     
-    # Get TOP 5 invoices by due amount
-    top_5_dues = sorted(invoice_dues, key=lambda x: x['due_amount'], reverse=True)[:5]
+    sales, pending, unpaid, partial = await asyncio.gather(
+        db.invoices.aggregate(sales_pipeline).to_list(1),
+        db.customer_balances.aggregate(pending_dues_pipeline).to_list(1),
+        largest("unpaid", "grand_total"),
+        largest("partial", "balance_due"),
+    )
+    sales = sales[0] if sales else {}
+    
+    top_5_dues = [
+        {
+            "invoice_id": invoice['id'],
+            "invoice_number": invoice.get('invoice_number'),
+            "customer_id": invoice.get('customer_id'),
+            "customer_name": invoice.get('customer_name'),
+            "invoice_date": invoice.get('invoice_date'),
+            "payment_status": invoice['payment_status'],
+            "grand_total": invoice.get('grand_total') or 0,
+            "paid_amount": invoice.get('paid_amount') or 0,
+            "due_amount": invoice_outstanding(invoice) / 100,
+        }
+        for invoice in [*unpaid, *partial]
+    ]
+    top_5_dues.sort(key=lambda due: (-due['due_amount'], due['invoice_id']))
     
     return {
-        "total_sales": total_sales,
-        "total_pending_dues": total_pending_dues,
-        "top_5_dues": top_5_dues,
-        "invoice_count": len(invoices)
+        "total_sales": sales.get('total_sales', 0),
+        # Balances are in paise
+        "total_pending_dues": pending[0]['total_pending_dues'] / 100 if pending else 0,
+        "top_5_dues": top_5_dues[:5],
+        "invoice_count": sales.get('invoice_count', 0)
+    }
+
+
+MAX_TIMESERIES_DAYS = 3 * 366
+
+
+def _timeseries_period(day: date, interval: str) -> str:
+    if interval == "week":
+        # Weeks start on Monday and are labelled by that day
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if interval == "month":
+        return day.strftime("%Y-%m")
+    return day.isoformat()
+
+
+@api_router.get("/dashboard/timeseries")
+async def get_dashboard_timeseries(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$")
+):
+    """
+    Sales, collected and outstanding amounts per day/week/month (IST business days),
+    read from the daily_sales rollups. Every period in the range is present, empty ones as zeros.
+    Defaults to the last 30 days.
+    """
+    try:
+        end = date.fromisoformat(end_date[:10]) if end_date else datetime.now(IST).date()
+        start = date.fromisoformat(start_date[:10]) if start_date else end - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if (end - start).days >= MAX_TIMESERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_TIMESERIES_DAYS} days")
+
+    def empty_bucket(period: str) -> dict:
+        return {"period": period, "invoice_count": 0, "sales": 0, "collected": 0, "outstanding": 0, "by_status": {}}
+
+    buckets = {}
+    day = start
+    while day <= end:
+        period = _timeseries_period(day, interval)
+        if period not in buckets:
+            buckets[period] = empty_bucket(period)
+        day += timedelta(days=1)
+
+    # Buckets whose invoices all moved elsewhere are left behind at zero; skip them
+    rollups = db.daily_sales.find(
+        {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}, "invoice_count": {"$gt": 0}}, {"_id": 0}
+    )
+    async for rollup in rollups:
+        bucket = buckets[_timeseries_period(date.fromisoformat(rollup['day']), interval)]
+        status = bucket['by_status'].setdefault(rollup['payment_status'], {"invoice_count": 0, "sales": 0})
+        bucket['invoice_count'] += rollup['invoice_count']
+        status['invoice_count'] += rollup['invoice_count']
+        status['sales'] += rollup['sales']
+        for field in ROLLUP_AMOUNT_FIELDS:
+            bucket[field] += rollup[field]
+
+    # Rollups are in paise
+    for bucket in buckets.values():
+        for field in ROLLUP_AMOUNT_FIELDS:
+            bucket[field] = bucket[field] / 100
+        for status in bucket['by_status'].values():
+            status['sales'] = status['sales'] / 100
+
+    return {
+        "interval": interval,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "buckets": list(buckets.values()),
     }
 
 
+# Receivables Routes
+@api_router.get("/reports/aging")
+async def get_aging_report(limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    Receivables aging (0-30, 31-60, 61-90, 90+ days since the invoice date) from the
+    customer balance ledger: totals over all customers plus the largest debtors.
+    """
+    today = datetime.now(IST).date()
+    totals = {"outstanding": 0, "customer_count": 0, "aging": dict.fromkeys((name for name, _, _ in AGING_BUCKETS), 0)}
+    customers = []
+    async for balance in db.customer_balances.find({"outstanding": {"$gt": 0}}).sort("outstanding", DESCENDING):
+        summary = balance_summary(balance, today)
+        totals['outstanding'] += balance['outstanding']
+        totals['customer_count'] += 1
+        for name, amount in summary['aging'].items():
+            totals['aging'][name] += to_paise(amount)
+        if len(customers) < limit:
+            customers.append(summary)
+    
+    totals['outstanding'] = totals['outstanding'] / 100
+    totals['aging'] = {name: amount / 100 for name, amount in totals['aging'].items()}
+    return {"as_of": today.isoformat(), "totals": totals, "customers": customers}
+
+@api_router.get("/reports/top-debtors")
+async def get_top_debtors(limit: int = Query(5, ge=1, le=100)):
+    """Customers with the highest outstanding balance"""
+    today = datetime.now(IST).date()
+    balances = await db.customer_balances.find({"outstanding": {"$gt": 0}}).sort("outstanding", DESCENDING).limit(limit).to_list(None)
+    return [balance_summary(balance, today) for balance in balances]
+
+@api_router.get("/reports/gst-summary")
+async def get_gst_summary_report(
+    month: str,
+    group_by: str = Query("hsn", pattern="^(hsn|rate)$"),
+    format: str = Query("json", pattern="^(json|csv|ndjson)$")
+):
+    """HSN-wise or GST-rate-wise taxable value and tax of a month's (YYYY-MM) active invoices"""
+    rows, cached = await get_gst_summary(month, group_by)
+    if format != "json":
+        async def stream_rows():
+            for row in rows:
+                yield row
+        return _export_response(stream_rows(), GST_SUMMARY_COLUMNS[group_by], format, f"gst_{group_by}_{month}")
+
+    totals = {column: round(sum(row[column] for row in rows), 2) for column in [*GST_SUMMARY_AMOUNTS, "total_tax"]}
+    totals['line_items'] = sum(row['line_items'] for row in rows)
+    return {"month": month, "group_by": group_by, "closed": is_closed_month(month), "cached": cached, "rows": rows, "totals": totals}
+
+
+# Admin Routes
+@api_router.get("/admin/indexes")
+async def get_admin_indexes():
+    """Report registry indexes that are missing, and existing indexes that are unused or unmanaged"""
+    return await get_index_report()
+
+@api_router.get("/admin/cache")
+async def get_admin_cache_stats():
+    """Hit/miss counters of the in-process caches"""
+    return {"admin_business": admin_business_cache.stats(), "invoice_pdfs": invoice_pdfs.stats()}
+
+@api_router.get("/admin/gst-audit")
+async def gst_audit():
+    """NDJSON: every invoice whose stored tax or totals differ from the tax engine's, then a summary"""
+    return StreamingResponse(_stream_ndjson(audit_gst()), media_type="application/x-ndjson")
+
+@api_router.post("/admin/rollups/rebuild")
+async def rebuild_rollups():
+    """Recompute the daily sales rollups and customer balances from the invoices and drop cached GST summaries"""
+    buckets, customers, _ = await asyncio.gather(
+        rebuild_daily_sales(), rebuild_customer_balances(), db.gst_summaries.delete_many({}),
+    )
+    return {"message": "Daily sales rollups and customer balances rebuilt", "buckets": buckets, "customers": customers}
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request, MongoDB command and pool checkout metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, *query_stats.QUERY_HEADERS],
+)
+
+# Queries each route is expected to issue (getMore batches of the same cursor are not
+# counted). A request over budget is logged as a warning and fails a benchmark run;
+# QUERY_BUDGETS (JSON, same keys) overrides or extends these.
+QUERY_BUDGETS = {
+    # A relevance-ranked search reads up to one query per tier
+    "GET /api/businesses": len(SEARCH_TIER_MARKS),
+    "GET /api/customers": len(SEARCH_TIER_MARKS),
+    "GET /api/products": len(SEARCH_TIER_MARKS),
+    "GET /api/invoices": len(SEARCH_TIER_MARKS),
+    # Conditional requests read the validators first, then the invoice if it changed
+    "GET /api/invoices/{invoice_id}": 2,
+    # Invoice, admin business, logo file and chunks
+    "GET /api/invoices/{invoice_id}/pdf": 4,
+    # Sales, customer balances, then the largest unpaid and partial dues
+    "GET /api/dashboard/stats": 4,
+    "GET /api/dashboard/timeseries": 1,
+    "GET /api/reports/aging": 1,
+    "GET /api/reports/top-debtors": 1,
+    # Admin business, invoice number, insert, then rollups, balances and GST summaries
+    "POST /api/invoices": 7,
+    "PUT /api/invoices/{invoice_id}": 6,
+    "POST /api/invoices/bulk": 6,
+    **json.loads(os.environ.get('QUERY_BUDGETS', '{}')),
+}
+
+# Per-request query counts, budgets and N+1 warnings; QUERY_STATS_DEBUG also sends the
+# counts as X-DB-* response headers and logs every request
+app.add_middleware(
+    query_stats.QueryStatsMiddleware,
+    budgets=QUERY_BUDGETS,
+    debug=os.environ.get('QUERY_STATS_DEBUG', '').lower() in ('1', 'true', 'yes'),
+    n_plus_one_threshold=int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5')),
 )
 
+# Outermost, so the latency includes the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -964,6 +2944,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+@app.exception_handler(DuplicateKeyError)
+async def duplicate_key_handler(request: Request, exc: DuplicateKeyError):
+    return JSONResponse(status_code=409, content={"detail": "A record with the same unique value already exists"})
+
+async def backfill_in_background():
+    """Search tokens and the invoice-derived collections, built while the app serves requests"""
+    for backfill in (backfill_search_tokens, backfill_daily_sales, backfill_customer_balances):
+        try:
+            await backfill()
+        except Exception:
+            logger.exception(f"{backfill.__name__} failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    await migrate_inline_logos()
+    await seed_invoice_counter()
+    # Legacy string timestamps and first-start backfills are handled while the app serves requests
+    background = [
+        asyncio.create_task(migrate_dates_in_background()),
+        asyncio.create_task(backfill_in_background()),
+    ]
+    yield
+    for task in background:
+        task.cancel()
+    invoice_pdfs.shutdown()
     client.close()
+
+app.router.lifespan_context = lifespan
@@ -19,7 +19,7 @@ const Archives = () => {
   const fetchDeletedInvoices = async () => {
     try {
       setLoading(true);
-      const res = await axios.get(`${API}/invoices?include_deleted=true`);
+      const res = await axios.get(`${API}/invoices?include_deleted=true&view=summary`);
       setDeletedInvoices(res.data);
       setLoading(false);
     } catch (error) {
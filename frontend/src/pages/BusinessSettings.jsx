@@ -9,6 +9,9 @@ import { Textarea } from '@/components/ui/textarea';
 import { toast } from 'sonner';
 import { Save, Building, Upload, X } from 'lucide-react';
 
+// Stored logos are API paths ("/logos/<sha256>"); older ones may still be data: URLs
+const logoSrc = (logo) => (logo.startsWith('data:') ? logo : `${API}${logo}`);
+
 const BusinessSettings = () => {
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
@@ -210,7 +213,7 @@ const BusinessSettings = () => {
                 <div className="flex items-center gap-4">
                   <div className="relative">
                     <img 
-                      src={logo} 
+                      src={logoSrc(logo)} 
                       alt="Business Logo" 
                       className="w-32 h-32 object-contain border-2 border-slate-200 rounded-lg p-2"
                     />
@@ -11,6 +11,12 @@ import { toast } from 'sonner';
 import { Plus, Trash2, Save, Receipt, Check, Edit2 } from 'lucide-react';
 import { useNavigate, useParams } from 'react-router-dom';
 
+// Two-digit GST state code from a state code or a GSTIN, normalised like the server's gst.state_code
+const gstStateCode = (value) => {
+  const match = /^\s*(\d{1,2})/.exec(value || '');
+  return match ? match[1].padStart(2, '0') : null;
+};
+
 const CreateInvoice = () => {
   const navigate = useNavigate();
   const { id: invoiceId } = useParams();
@@ -160,6 +166,14 @@ const CreateInvoice = () => {
   // Determine GST type when customer is selected
   useEffect(() => {
     if (selectedCustomer && adminBusiness) {
+      // Same rule as the server: compare GST state codes when both are known
+      const adminStateCode = gstStateCode(adminBusiness.state_code) || gstStateCode(adminBusiness.gstin);
+      const customerStateCode = gstStateCode(selectedCustomer.gstin);
+      if (adminStateCode && customerStateCode) {
+        setGstType(adminStateCode === customerStateCode ? 'cgst_sgst' : 'igst');
+        return;
+      }
+
       const customerState = selectedCustomer.state_1 || '';
       const adminState = adminBusiness.state || '';
       
@@ -28,6 +28,7 @@ const InvoiceList = () => {
       if (endDate) params.append('end_date', endDate);
       params.append('sort_by', sortBy);
       params.append('sort_order', sortOrder);
+      params.append('view', 'summary');
       
       const res = await axios.get(`${API}/invoices?${params.toString()}`);
       setInvoices(res.data);
@@ -69,10 +70,14 @@ const InvoiceList = () => {
     }
   };
   
-  const downloadPDF = async (invoice) => {
+  const downloadPDF = async (invoiceSummary) => {
     try {
-      // Fetch business details for the invoice header
-      const businessRes = await axios.get(`${API}/business`);
+      // The list only holds summaries; fetch the full invoice and business details for the header
+      const [invoiceRes, businessRes] = await Promise.all([
+        axios.get(`${API}/invoices/${invoiceSummary.id}`),
+        axios.get(`${API}/business`)
+      ]);
+      const invoice = invoiceRes.data;
       const business = businessRes.data;
       
       // Generate properly formatted invoice HTML matching InvoiceView format
@@ -0,0 +1,39 @@
+import os
+import sys
+from pathlib import Path
+
+from bson import SON
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'billing_test')
+
+import server  # noqa: E402
+
+
+def son(value):
+    return SON((k, son(v)) for k, v in value.items()) if isinstance(value, dict) else value
+
+
+def decoded(spec: dict) -> dict:
+    """An IndexModel document as index_information() returns it: SON sub-documents, key as pairs"""
+    info = {"v": 2, "key": list(spec['key'].items())}
+    for option, value in spec.items():
+        if option not in ("key", "name"):
+            info[option] = son(value)
+    return info
+
+
+def test_decoded_indexes_match_the_registry():
+    for collection_name, models in server.INDEXES.items():
+        for model in models:
+            spec = model.document
+            assert server._index_signature(decoded(spec)) == server._index_signature(spec), \
+                f"{collection_name}.{spec['name']}"
+
+
+def test_partial_filter_change_is_detected():
+    spec = next(m.document for m in server.INDEXES["businesses"] if m.document['name'] == "gstin_unique")
+    changed = decoded(spec)
+    changed['partialFilterExpression'] = SON([("gstin", SON([("$type", "string")]))])
+    assert server._index_signature(changed) != server._index_signature(spec)